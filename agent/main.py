@@ -1,33 +1,29 @@
-import pandas as pd
-import json
-import random
+import asyncio
+import orjson
 import sys
 import tempfile
 import os
-from typing import Dict, Any, List, Tuple, Optional
-from openpyxl import load_workbook
+from typing import Dict, Any, List, Tuple, Optional, Union, BinaryIO
 from io import BytesIO
-from datetime import datetime
-
-# Google Cloud imports
-from google.cloud import firestore
-from google.cloud import storage
-from google.oauth2 import service_account
-
-# Try to import Google GenAI library
-try:
-    from google import genai
-    from google.genai import types
-    GENAI_AVAILABLE = True
-except ImportError:
-    GENAI_AVAILABLE = False
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from importlib.util import find_spec
+import re
+
+# Heavy libraries (openpyxl, Google Cloud SDKs, google-genai, PDF parsers) are
+# imported inside the functions that use them to keep job start-up fast.
+# Only check here whether the optional ones are installed.
+GENAI_AVAILABLE = find_spec("google.genai") is not None
+if not GENAI_AVAILABLE:
     print("Warning: google-genai library not found. Install with: pip install google-genai")
 
-try:
-    import PyPDF2
-except ImportError:
-    PyPDF2 = None
-    print("Warning: PyPDF2 not found. Install with: pip install PyPDF2")
+# pypdfium2 parses PDFs; PyPDF2 is only a fallback for environments without it
+PDFIUM_AVAILABLE = find_spec("pypdfium2") is not None
+PYPDF2_AVAILABLE = find_spec("PyPDF2") is not None
+if not PDFIUM_AVAILABLE and not PYPDF2_AVAILABLE:
+    print("Warning: no PDF parser found (pypdfium2 or PyPDF2). Install with: pip install pypdfium2")
+elif not PDFIUM_AVAILABLE:
+    print("Warning: pypdfium2 not found, falling back to PyPDF2. Install with: pip install pypdfium2")
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -37,28 +33,66 @@ PROJECT_ID = os.environ.get("PROJECT_ID")
 STORAGE_BUCKET = os.environ.get("STORAGE_BUCKET")
 FIREBASE_SERVICE_ACCOUNT = os.environ.get("FIREBASE_SERVICE_ACCOUNT")
 GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
+# Set to "false" to write solutions as plain values (faster, drops template styling)
+PRESERVE_TEMPLATE_FORMATTING = os.environ.get("PRESERVE_TEMPLATE_FORMATTING", "true").lower() != "false"
+
+# Upper bound on concurrent blob downloads per request
+MAX_DOWNLOAD_WORKERS = 16
+
+# Slice size for concurrent (sliced) downloads of a single blob
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Connections kept per host by the storage client's HTTP session
+HTTP_POOL_SIZE = 64
+
+# Below this total PDF size, parsing in-process beats paying for worker start-up
+PARALLEL_PDF_PARSE_MIN_BYTES = 1024 * 1024
+
+# Template header row is expected near the top; stop looking after this many rows
+HEADER_SEARCH_MAX_ROWS = 50
+
+# Strings that float() parses as plain decimal numbers, e.g. " 2021", "-1.5", "3e2"
+_NUMERIC_RE = re.compile(r'\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$')
+
+
+@lru_cache(maxsize=1)
+def get_service_account_credentials():
+    """Return service account credentials parsed once from the env JSON."""
+    from google.oauth2 import service_account
+    
+    return service_account.Credentials.from_service_account_info(
+        orjson.loads(FIREBASE_SERVICE_ACCOUNT)
+    )
 
 
+@lru_cache(maxsize=1)
 def get_firestore_client():
     """Return Firestore client using service account JSON from env."""
     if not FIREBASE_SERVICE_ACCOUNT or not PROJECT_ID:
         raise RuntimeError("FIREBASE_SERVICE_ACCOUNT or PROJECT_ID env var not set")
 
-    credentials = service_account.Credentials.from_service_account_info(
-        json.loads(FIREBASE_SERVICE_ACCOUNT)
-    )
+    from google.cloud import firestore
+    
+    credentials = get_service_account_credentials()
     return firestore.Client(credentials=credentials, project=PROJECT_ID, database='ats-db')
 
 
+@lru_cache(maxsize=1)
 def get_storage_client():
     """Return Firebase Storage client using service account JSON from env."""
     if not FIREBASE_SERVICE_ACCOUNT or not STORAGE_BUCKET:
         raise RuntimeError("FIREBASE_SERVICE_ACCOUNT or STORAGE_BUCKET env var not set")
     
-    credentials = service_account.Credentials.from_service_account_info(
-        json.loads(FIREBASE_SERVICE_ACCOUNT)
-    )
-    return storage.Client(credentials=credentials, project=PROJECT_ID)
+    from google.cloud import storage
+    from requests.adapters import HTTPAdapter
+    
+    credentials = get_service_account_credentials()
+    client = storage.Client(credentials=credentials, project=PROJECT_ID)
+    
+    # Size the HTTP connection pool for concurrent blob downloads
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+    client._http.mount("https://", adapter)
+    return client
 
 
 def excel_to_json(excel_path: str, output_json_path: str = None) -> Dict[str, Dict[str, Any]]:
@@ -78,62 +112,68 @@ def excel_to_json(excel_path: str, output_json_path: str = None) -> Dict[str, Di
         Dictionary where keys are row names and values are dictionaries with column names as keys
         Format: {row_name: {col_name: value, ...}, ...}
     """
-    # Read Excel file
-    df = pd.read_excel(excel_path, header=None)
-    
-    # Remove completely empty rows
-    df = df.dropna(how='all')
-    
-    # Remove completely empty columns
-    df = df.dropna(axis=1, how='all')
-    
-    # Reset index after dropping rows
-    df = df.reset_index(drop=True)
+    from openpyxl import load_workbook
     
+    # Read Excel file in read-only mode (cell values only, no styles/formulas)
+    wb = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        # Single pass: remove completely empty rows and record which columns hold values
+        rows = []
+        non_empty_cols = set()
+        for row in ws.iter_rows(values_only=True):
+            present = [j for j, v in enumerate(row) if v is not None]
+            if present:
+                rows.append(row)
+                non_empty_cols.update(present)
+    finally:
+        wb.close()
+
     # First row should be column headers
-    if len(df) == 0:
+    if len(rows) == 0:
         return {}
-    
-    # Set first row as column headers
-    df.columns = df.iloc[0]
-    df = df[1:].reset_index(drop=True)
-    
-    # First column should be row names
-    if len(df.columns) == 0:
-        return {}
-    
-    # Set first column as index (row names)
-    row_name_col = df.columns[0]
-    df = df.set_index(row_name_col)
-    
-    # Remove any rows where the row name is empty/NaN
-    df = df[df.index.notna()]
-    
+
+    # Remove completely empty columns (rows may be ragged in read-only mode)
+    keep_cols = sorted(non_empty_cols)
+    rows = [tuple(row[j] if j < len(row) else None for j in keep_cols) for row in rows]
+
+    # First row holds column headers, first column holds row names
+    # Stringify the headers once rather than once per row
+    headers = [str(col_name) for col_name in rows[0][1:]]
+
     # Convert to nested dictionary structure
     result = {}
-    for row_name, row_data in df.iterrows():
-        row_dict = {}
-        
-        # Add all column values
-        for col_name, value in row_data.items():
-            # Convert NaN to None for JSON serialization
-            if pd.isna(value):
-                row_dict[str(col_name)] = None
-            else:
-                row_dict[str(col_name)] = value
-        
+    for row in rows[1:]:
+        row_name = row[0]
+        # Remove any rows where the row name is empty
+        if row_name is None:
+            continue
+
         # Use row name as key in result dictionary
-        result[str(row_name) if pd.notna(row_name) else ""] = row_dict
-    
+        result[str(row_name)] = dict(zip(headers, row[1:]))
+
     # Save to JSON if output path provided
     if output_json_path:
-        with open(output_json_path, 'w', encoding='utf-8') as f:
-            json.dump(result, f, indent=2, ensure_ascii=False, default=str)
+        with open(output_json_path, 'wb') as f:
+            f.write(orjson.dumps(result, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
     
     return result
 
 
-def json_to_excel_template(json_data: Dict[str, Any], template_path: str, output_excel_path: str) -> None:
+@lru_cache(maxsize=None)
+def normalize_col_name(value):
+    """Convert column value to string, handling numeric values."""
+    if value is None:
+        return None
+    # If it's a number, canonicalize through float so 2021, 2021.0 and "2021" all match
+    if isinstance(value, (int, float)) or (isinstance(value, str) and _NUMERIC_RE.match(value)):
+        return str(float(value))
+    return str(value).strip()
+
+
+def json_to_excel_template(json_data: Dict[str, Any], template_path: str,
+                           output_excel_path: Union[str, BinaryIO],
+                           preserve_formatting: bool = True) -> None:
     """
     Fill JSON data into a template Excel file, preserving the exact template structure.
     
@@ -145,27 +185,40 @@ def json_to_excel_template(json_data: Dict[str, Any], template_path: str, output
     Args:
         json_data: Dictionary with the data to fill
         template_path: Path to the template Excel file
-        output_excel_path: Path to save the filled Excel file
+        output_excel_path: Path or binary file object to save the filled Excel file to
+        preserve_formatting: If False, only cell values of the active sheet are written,
+            using openpyxl's streaming write-only mode (much faster to save, but styles,
+            merged cells and other sheets are dropped)
     """
     if not json_data or not isinstance(json_data, dict):
         # If no JSON data, just copy the template
         import shutil
-        shutil.copy(template_path, output_excel_path)
+        if isinstance(output_excel_path, str):
+            shutil.copy(template_path, output_excel_path)
+        else:
+            with open(template_path, 'rb') as template_file:
+                shutil.copyfileobj(template_file, output_excel_path)
         return
     
+    from openpyxl import load_workbook
+    
     # Load template workbook
     wb = load_workbook(template_path)
     ws = wb.active
     
-    # Find the header row (first row with column names)
-    # Look for the first row that has non-empty cells
-    header_row_idx = None
+    # Sheet dimensions are computed once; keep cell objects since values are written back below
+    max_row = ws.max_row
     max_col = ws.max_column
     
-    for row_idx in range(1, ws.max_row + 1):
-        row_values = [ws.cell(row=row_idx, column=col).value for col in range(1, max_col + 1)]
-        if any(v is not None and str(v).strip() != '' for v in row_values):
+    # Find the header row (first row with column names)
+    # Look for the first row that has non-empty cells, within the top of the sheet only
+    header_row_idx = None
+    header_row = None
+    header_rows = ws.iter_rows(max_row=min(max_row, HEADER_SEARCH_MAX_ROWS), max_col=max_col)
+    for row_idx, row in enumerate(header_rows, start=1):
+        if any(cell.value is not None and str(cell.value).strip() != '' for cell in row):
             header_row_idx = row_idx
+            header_row = row
             break
     
     if header_row_idx is None:
@@ -173,106 +226,134 @@ def json_to_excel_template(json_data: Dict[str, Any], template_path: str, output
         wb.save(output_excel_path)
         return
     
+    # Read the rows below the header in a single pass
+    data_rows = list(ws.iter_rows(min_row=header_row_idx + 1, max_row=max_row, max_col=max_col))
+    
     # Find row name column first
     row_name_col = 2  # Default to column B
     
     # Check if column 1 has values, if not use column 2
-    has_col1_values = any(
-        ws.cell(row=row_idx, column=1).value is not None 
-        for row_idx in range(header_row_idx + 1, min(header_row_idx + 10, ws.max_row + 1))
-    )
+    has_col1_values = any(row[0].value is not None for row in data_rows[:9])
     if has_col1_values:
         row_name_col = 1
     
     # Extract column headers from header row
     # Start from the column after the row name column
     column_headers = {}  # col_idx -> original_value
-    start_col = row_name_col + 1
-    for col_idx in range(start_col, max_col + 1):
-        cell_value = ws.cell(row=header_row_idx, column=col_idx).value
-        if cell_value is not None and str(cell_value).strip() != '':
-            column_headers[col_idx] = cell_value
-    
-    # Helper function to normalize column names for matching
-    def normalize_col_name(value):
-        """Convert column value to string, handling numeric values."""
-        if value is None:
-            return None
-        try:
-            # If it's a number, try to match both with and without .0
-            num_val = float(value)
-            return str(num_val)
-        except:
-            return str(value).strip()
+    for cell in header_row[row_name_col:]:
+        if cell.value is not None and str(cell.value).strip() != '':
+            column_headers[cell.column] = cell.value
     
     # Get sample JSON row to understand column name format
     sample_json_row = next(iter(json_data.values())) if json_data else {}
     json_col_names = set(sample_json_row.keys()) if isinstance(sample_json_row, dict) else set()
     
+    # Hash normalized template headers so each JSON column is matched with a lookup
+    norm_to_col = {normalize_col_name(col_value): col_idx for col_idx, col_value in column_headers.items()}
+    # Fallback table for .0 suffix variations
+    norm_stripped_to_col = {norm.replace('.0', ''): col_idx for norm, col_idx in norm_to_col.items()}
+    
     # Create mapping: JSON column name -> Excel column index
     json_to_col = {}
-    for col_idx, col_value in column_headers.items():
-        normalized_template = normalize_col_name(col_value)
-        
-        # Try to find matching JSON column name
-        for json_col_name in json_col_names:
-            normalized_json = normalize_col_name(json_col_name)
-            
-            # Try exact match
-            if normalized_template == normalized_json:
-                json_to_col[json_col_name] = col_idx
-                break
-            # Try with .0 suffix variations
-            try:
-                if normalized_template.replace('.0', '') == normalized_json.replace('.0', ''):
-                    json_to_col[json_col_name] = col_idx
-                    break
-            except:
-                pass
+    for json_col_name in json_col_names:
+        normalized_json = normalize_col_name(json_col_name)
+        # Try exact match, then with .0 suffix variations
+        col_idx = norm_to_col.get(normalized_json)
+        if col_idx is None:
+            col_idx = norm_stripped_to_col.get(normalized_json.replace('.0', ''))
+        if col_idx is not None:
+            json_to_col[json_col_name] = col_idx
     
     # Find row names and map them
     # Row names are in the identified row_name_col, starting from row after header
     row_name_to_row_idx = {}
-    for row_idx in range(header_row_idx + 1, ws.max_row + 1):
-        cell_value = ws.cell(row=row_idx, column=row_name_col).value
+    for row_idx, row in enumerate(data_rows, start=header_row_idx + 1):
+        if len(row) < row_name_col:
+            continue
+        cell_value = row[row_name_col - 1].value
         if cell_value is not None and str(cell_value).strip() != '':
             row_name = str(cell_value).strip()
             row_name_to_row_idx[row_name] = row_idx
     
-    # Fill in the data from JSON
+    # Case-insensitive lookup; the first template row with a given name wins
+    lower_row_name_to_row_idx = {}
+    for template_row_name, template_row_idx in row_name_to_row_idx.items():
+        lower_row_name_to_row_idx.setdefault(template_row_name.lower(), template_row_idx)
+    
+    # Collect the values to write, grouped by template row
+    fills = {}  # row_idx -> {col_idx: value}
     for json_row_name, json_row_data in json_data.items():
         if not isinstance(json_row_data, dict):
             continue
         
         # Find matching row in template
-        row_idx = None
-        # Try exact match first
-        if json_row_name in row_name_to_row_idx:
-            row_idx = row_name_to_row_idx[json_row_name]
-        else:
-            # Try case-insensitive match
-            for template_row_name, template_row_idx in row_name_to_row_idx.items():
-                if json_row_name.lower() == template_row_name.lower():
-                    row_idx = template_row_idx
-                    break
+        # Try exact match first, then case-insensitive match
+        row_idx = row_name_to_row_idx.get(json_row_name)
+        if row_idx is None:
+            row_idx = lower_row_name_to_row_idx.get(json_row_name.lower())
         
         if row_idx is None:
             # Row not found in template, skip it
             continue
         
         # Fill in column values
+        row_fills = fills.setdefault(row_idx, {})
         for json_col_name, json_value in json_row_data.items():
             # Find matching column using the mapping
             if json_col_name in json_to_col:
-                col_idx = json_to_col[json_col_name]
-                # Write the value to the cell
-                cell = ws.cell(row=row_idx, column=col_idx)
-                cell.value = json_value
+                row_fills[json_to_col[json_col_name]] = json_value
+    
+    if not preserve_formatting:
+        _save_values_write_only(ws, fills, max_row, max_col, output_excel_path)
+        return
+    
+    # Write the values to the cells
+    for row_idx, row_fills in fills.items():
+        for col_idx, value in row_fills.items():
+            ws.cell(row=row_idx, column=col_idx).value = value
     
     # Save the filled workbook
     wb.save(output_excel_path)
 
 
+def _save_values_write_only(ws, fills: Dict[int, Dict[int, Any]], max_row: int, max_col: int,
+                            output_excel_path: Union[str, BinaryIO]) -> None:
+    """Stream the worksheet's values, with fills applied, into a new write-only workbook."""
+    from openpyxl import Workbook
+    
+    out_wb = Workbook(write_only=True)
+    out_ws = out_wb.create_sheet(ws.title)
+    
+    for row_idx, row in enumerate(ws.iter_rows(max_row=max_row, max_col=max_col, values_only=True), start=1):
+        row_fills = fills.get(row_idx)
+        if row_fills:
+            row = list(row)
+            for col_idx, value in row_fills.items():
+                row[col_idx - 1] = value
+        out_ws.append(row)
+    
+    out_wb.save(output_excel_path)
+
+
+def json_to_excel_template_bytes(json_data: Dict[str, Any], template_path: str,
+                                 preserve_formatting: bool = True) -> BytesIO:
+    """
+    Fill JSON data into a template Excel file and return the result in memory.
+    
+    Args:
+        json_data: Dictionary with the data to fill
+        template_path: Path to the template Excel file
+        preserve_formatting: See json_to_excel_template
+    
+    Returns:
+        BytesIO buffer holding the filled workbook, positioned at the start
+    """
+    buffer = BytesIO()
+    json_to_excel_template(json_data, template_path, buffer, preserve_formatting=preserve_formatting)
+    buffer.seek(0)
+    return buffer
+
+
 def create_simplified_schema(template_json: Dict[str, Any]) -> Dict[str, Any]:
     """
     Creates a simplified JSON schema that defines the structure of a row,
@@ -340,13 +421,22 @@ def create_simplified_schema(template_json: Dict[str, Any]) -> Dict[str, Any]:
 
 
 def generate_solution_from_template_and_pdfs(template_json: Dict[str, Dict[str, Any]], 
-                                             pdf_data: Dict[str, Any] = None) -> Dict[str, Dict[str, Any]]:
+                                             pdf_data: Dict[str, Any] = None,
+                                             pdf_files: List[Tuple[str, bytes]] = None) -> Dict[str, Dict[str, Any]]:
     """
-    Generate a solution JSON structure from template and parsed PDF data using Gemini API.
+    Generate a solution JSON structure from template and PDF data using Gemini API.
+    
+    When raw PDF files are given they are sent to Gemini as document parts, which
+    keeps tables/layout intact and avoids truncating the text. Otherwise the
+    extracted text in pdf_data is inlined in the prompt.
+    
+    Each document is sent in its own concurrent request and the per-row results
+    are merged, taking the first non-null value found for each cell.
     
     Args:
         template_json: Template JSON structure with row names and column names
         pdf_data: Dictionary with extracted data from PDFs
+        pdf_files: List of tuples (filename, pdf_bytes) to send to Gemini directly
     
     Returns:
         JSON structure with same keys but populated with solution values
@@ -359,19 +449,30 @@ def generate_solution_from_template_and_pdfs(template_json: Dict[str, Dict[str,
         print("Warning: google-genai library not available. Falling back to random generation.")
         return _generate_random_placeholder(template_json)
 
-    if not pdf_data:
+    if not pdf_data and not pdf_files:
         print("Warning: No PDF data provided. Falling back to random generation.")
         return _generate_random_placeholder(template_json)
 
     print("Generating solution using Gemini API...")
     
     try:
+        from google import genai
+        from google.genai import types
+        
         client = genai.Client(api_key=GOOGLE_API_KEY)
         
-        # Prepare context from PDFs
-        pdf_context = ""
-        for filename, text in pdf_data.items():
-            pdf_context += f"\n--- Start of {filename} ---\n{text}\n--- End of {filename} ---\n"
+        # Prepare one context chunk per PDF so each document gets its own call
+        if pdf_files:
+            document_chunks = [
+                ([types.Part.from_bytes(data=pdf_bytes, mime_type="application/pdf")],
+                 f"The document {filename} is attached as a PDF file.")
+                for filename, pdf_bytes in pdf_files
+            ]
+        else:
+            document_chunks = [
+                ([], f"\n--- Start of {filename} ---\n{text}\n--- End of {filename} ---\n")
+                for filename, text in pdf_data.items()
+            ]
             
         # Construct simplified schema based on template columns
         json_schema = create_simplified_schema(template_json)
@@ -380,11 +481,12 @@ def generate_solution_from_template_and_pdfs(template_json: Dict[str, Dict[str,
         row_names_list = list(template_json.keys())
         row_names_str = "\n".join([f"- {name}" for name in row_names_list])
         
-        prompt = f"""
+        def build_prompt(document_text: str) -> str:
+            return f"""
         You are an expert financial analyst. Your task is to extract financial data from the provided documents and populate a structured JSON list.
         
         INSTRUCTIONS:
-        1. Read the provided document text carefully.
+        1. Read the provided documents carefully.
         2. Extract values for each row listed below.
         3. For each row, populate the values for the defined years/columns.
         4. If a value is explicitly mentioned, use it.
@@ -397,31 +499,25 @@ def generate_solution_from_template_and_pdfs(template_json: Dict[str, Dict[str,
         {row_names_str}
         
         DOCUMENT TEXT:
-        {pdf_context[:50000]}
+        {document_text}
         
         Generate the JSON response matching the schema.
         """
         
-        # Call Gemini API
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
-            config={
-                "response_mime_type": "application/json",
-                "response_schema": json_schema,
-            },
-        )
+        # Call Gemini API for every document concurrently
+        row_maps = asyncio.run(_generate_row_maps(
+            client,
+            [[*parts, build_prompt(document_text)] for parts, document_text in document_chunks],
+            json_schema,
+        ))
         
         # Parse response and convert back to template structure
-        if response.text:
-            generated_data_raw = json.loads(response.text)
-            
+        if row_maps:
             # Convert list format back to dictionary format {row_name: {col: val}}
             generated_data = {}
             
             # Helper to quickly find row data
-            rows_list = generated_data_raw.get("financial_data", [])
-            row_map = {item.get("row_name"): item.get("values") for item in rows_list}
+            row_map = _merge_row_maps(row_maps)
             
             # Fill the template structure
             for row_name in template_json.keys():
@@ -449,8 +545,71 @@ def generate_solution_from_template_and_pdfs(template_json: Dict[str, Dict[str,
         return _generate_random_placeholder(template_json)
 
 
+async def _generate_row_maps(client, contents_list: List[List[Any]],
+                             json_schema: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Run one Gemini call per contents list concurrently.
+    
+    Returns:
+        List of {row_name: values} maps, one per successful non-empty response
+    """
+    async def generate(contents):
+        response = await client.aio.models.generate_content(
+            model="gemini-2.5-flash",
+            contents=contents,
+            config={
+                "response_mime_type": "application/json",
+                "response_schema": json_schema,
+            },
+        )
+        if not response.text:
+            return None
+        rows_list = orjson.loads(response.text).get("financial_data", [])
+        return {item.get("row_name"): item.get("values") for item in rows_list}
+    
+    results = await asyncio.gather(*(generate(contents) for contents in contents_list),
+                                   return_exceptions=True)
+    
+    row_maps = []
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Error calling Gemini API for one document: {str(result)}")
+        elif result is None:
+            print("Warning: Empty response from LLM for one document.")
+        else:
+            row_maps.append(result)
+    return row_maps
+
+
+def _merge_row_maps(row_maps: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge per-document {row_name: values} maps, keeping the first non-null value for each cell."""
+    merged = {}
+    for row_map in row_maps:
+        for row_name, values in row_map.items():
+            merged_values = merged.get(row_name)
+            if not isinstance(merged_values, dict):
+                merged[row_name] = dict(values) if isinstance(values, dict) else values
+                continue
+            if isinstance(values, dict):
+                for col_name, value in values.items():
+                    if merged_values.get(col_name) is None:
+                        merged_values[col_name] = value
+    return merged
+
+
 def _generate_random_placeholder(template_json: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
     """Fallback function for random generation if API fails."""
+    # Imported lazily so the happy path does not pay numpy's import cost
+    import numpy as np
+    
+    # Draw every missing cell value in one vectorized call
+    missing_count = sum(
+        1
+        for row_data in template_json.values() if isinstance(row_data, dict)
+        for value in row_data.values() if value is None
+    )
+    random_values = iter(np.random.default_rng().uniform(0, 1000000, missing_count).round(2).tolist())
+    
     generated_json = {}
     
     for row_name, row_data in template_json.items():
@@ -461,7 +620,7 @@ def _generate_random_placeholder(template_json: Dict[str, Dict[str, Any]]) -> Di
         generated_row = {}
         for col_name, value in row_data.items():
             if value is None:
-                generated_row[col_name] = round(random.uniform(0, 1000000), 2)
+                generated_row[col_name] = next(random_values)
             else:
                 generated_row[col_name] = value
         
@@ -470,10 +629,54 @@ def _generate_random_placeholder(template_json: Dict[str, Dict[str, Any]]) -> Di
     return generated_json
 
 
+def _extract_pdf_text(pdf_item: Tuple[str, bytes]) -> Tuple[str, str]:
+    """
+    Extract all text from a single PDF.
+    
+    Defined at module level so it can be dispatched to worker processes.
+    
+    Args:
+        pdf_item: Tuple (filename, pdf_bytes)
+    
+    Returns:
+        Tuple (filename, extracted_text), with an error message instead of text on failure
+    """
+    filename, pdf_bytes = pdf_item
+    try:
+        if PDFIUM_AVAILABLE:
+            import pypdfium2 as pdfium
+            
+            # PDFium (native) extraction, much faster than PyPDF2's pure-Python parser
+            pdf = pdfium.PdfDocument(pdf_bytes)
+            try:
+                extracted_text = "".join(page.get_textpage().get_text_range() for page in pdf)
+            finally:
+                pdf.close()
+        else:
+            import PyPDF2
+            
+            # Create a BytesIO object from the bytes
+            pdf_file = BytesIO(pdf_bytes)
+            pdf_reader = PyPDF2.PdfReader(pdf_file)
+            
+            # Extract text from all pages
+            extracted_text = "".join(page.extract_text() for page in pdf_reader.pages)
+        print(f"Extracted {len(extracted_text)} characters from {filename}")
+        return filename, extracted_text
+        
+    except Exception as e:
+        print(f"Error extracting text from {filename}: {str(e)}")
+        # Store error message instead of text
+        return filename, f"Error: {str(e)}"
+
+
 def parse_pdfs_from_bytes(pdf_bytes_list: List[Tuple[str, bytes]]) -> Dict[str, Any]:
     """
     Extract all text from PDF files provided as bytes.
     
+    PDFs are parsed in parallel worker processes when there is more than one
+    PDF and enough input to amortize the worker start-up cost.
+    
     Args:
         pdf_bytes_list: List of tuples (filename, pdf_bytes)
     
@@ -481,34 +684,77 @@ def parse_pdfs_from_bytes(pdf_bytes_list: List[Tuple[str, bytes]]) -> Dict[str,
         Dictionary with extracted text from PDFs, keyed by filename
         Format: {filename: extracted_text, ...}
     """
-    if PyPDF2 is None:
-        raise ImportError("PyPDF2 is required for PDF parsing. Install it with: pip install PyPDF2")
+    if not PDFIUM_AVAILABLE and not PYPDF2_AVAILABLE:
+        raise ImportError("pypdfium2 or PyPDF2 is required for PDF parsing. Install it with: pip install pypdfium2")
     
-    pdf_data = {}
+    total_bytes = sum(len(pdf_bytes) for _, pdf_bytes in pdf_bytes_list)
+    max_workers = min(os.cpu_count() or 1, len(pdf_bytes_list))
     
-    for filename, pdf_bytes in pdf_bytes_list:
-        try:
-            # Create a BytesIO object from the bytes
-            pdf_file = BytesIO(pdf_bytes)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            
-            # Extract text from all pages
-            extracted_text = ""
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                page_text = page.extract_text()
-                extracted_text += page_text
-            
-            # Store extracted text with filename as key
-            pdf_data[filename] = extracted_text
-            print(f"Extracted {len(extracted_text)} characters from {filename}")
-            
-        except Exception as e:
-            print(f"Error extracting text from {filename}: {str(e)}")
-            # Store error message instead of text
-            pdf_data[filename] = f"Error: {str(e)}"
+    if max_workers > 1 and total_bytes >= PARALLEL_PDF_PARSE_MIN_BYTES:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_extract_pdf_text, pdf_bytes_list))
+    else:
+        results = [_extract_pdf_text(pdf_item) for pdf_item in pdf_bytes_list]
     
-    return pdf_data
+    # Store extracted text with filename as key
+    return dict(results)
+
+
+def _download_template(bucket, template_blob_path: str, template_local_path: str) -> None:
+    """Download the template blob to a local file in concurrent slices, failing if it does not exist."""
+    from google.api_core.exceptions import NotFound
+    from google.cloud.storage import transfer_manager
+    
+    try:
+        transfer_manager.download_chunks_concurrently(
+            bucket.blob(template_blob_path),
+            template_local_path,
+            chunk_size=DOWNLOAD_CHUNK_SIZE,
+            worker_type=transfer_manager.THREAD,
+            max_workers=MAX_DOWNLOAD_WORKERS,
+        )
+    except NotFound:
+        raise RuntimeError(f"Template file not found in storage: {template_blob_path}")
+
+
+def _download_pdfs(bucket, pdf_blob_paths: List[str]) -> List[Tuple[str, bytes]]:
+    """
+    Download all PDF blobs concurrently, skipping any that do not exist.
+
+    Returns:
+        List of tuples (filename, pdf_bytes) in the order of pdf_blob_paths
+    """
+    from google.api_core.exceptions import NotFound
+    from google.cloud.storage import transfer_manager
+    
+    buffers = [BytesIO() for _ in pdf_blob_paths]
+    results = transfer_manager.download_many(
+        [(bucket.blob(path), buffer) for path, buffer in zip(pdf_blob_paths, buffers)],
+        worker_type=transfer_manager.THREAD,
+        max_workers=min(MAX_DOWNLOAD_WORKERS, len(pdf_blob_paths)),
+    )
+
+    pdf_bytes_list = []
+    for pdf_blob_path, buffer, result in zip(pdf_blob_paths, buffers, results):
+        if isinstance(result, NotFound):
+            print(f"[PROCESS] Warning: PDF file not found in storage: {pdf_blob_path}, skipping")
+            continue
+        if isinstance(result, Exception):
+            raise result
+
+        pdf_bytes = buffer.getvalue()
+        # Extract original filename from blob path (remove prefix like "pdf_1_")
+        filename = os.path.basename(pdf_blob_path)
+        # If filename starts with "pdf_", try to extract original name
+        if filename.startswith('pdf_') and '_' in filename:
+            # Remove "pdf_X_" prefix
+            parts = filename.split('_', 2)
+            if len(parts) >= 3:
+                filename = parts[2]
+        pdf_bytes_list.append((filename, pdf_bytes))
+        print(f"[PROCESS] Downloaded PDF: {filename} ({len(pdf_bytes)} bytes)")
+
+    return pdf_bytes_list
 
 
 def process_request(request_id: str):
@@ -517,10 +763,10 @@ def process_request(request_id: str):
     
     Steps:
     1. Get request details from Firestore
-    2. Download template Excel and PDFs from Storage
+    2. Download template Excel and PDFs from Storage (PDFs only when Gemini is configured)
     3. Parse template to JSON
-    4. Parse PDFs to extract text
-    5. Generate solution JSON using LLM
+    4. Skip local PDF parsing; Gemini reads the PDF files directly
+    5. Generate solution JSON using LLM (random placeholders without Gemini)
     6. Convert solution JSON to Excel using template structure
     7. Upload solution.xlsx to Storage
     8. Update Firestore request status to 'completed'
@@ -530,6 +776,9 @@ def process_request(request_id: str):
     """
     print(f"[PROCESS] Starting processing for request: {request_id}")
     
+    # Timestamps are set by Firestore, matching the server, so they don't depend on this host's clock
+    from google.cloud.firestore import DELETE_FIELD, SERVER_TIMESTAMP
+    
     # Initialize clients
     firestore_client = get_firestore_client()
     storage_client = get_storage_client()
@@ -546,13 +795,6 @@ def process_request(request_id: str):
     request_data = request_doc.to_dict()
     print(f"[PROCESS] Request found: {request_data.get('template_filename')}, {request_data.get('pdf_count')} PDFs")
     
-    # Update status to processing
-    request_ref.update({
-        'status': 'processing',
-        'updated_at': datetime.utcnow()
-    })
-    print(f"[PROCESS] Updated status to 'processing'")
-    
     try:
         # Create temporary directory for processing
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -563,75 +805,84 @@ def process_request(request_id: str):
             if not template_blob_path:
                 raise RuntimeError("Template blob path not found in request")
             
-            template_blob = bucket.blob(template_blob_path)
-            if not template_blob.exists():
-                raise RuntimeError(f"Template file not found in storage: {template_blob_path}")
-            
             # Determine file extension from blob path or use .xlsx as default
             template_ext = template_blob_path.split('.')[-1] if '.' in template_blob_path else 'xlsx'
             template_local_path = os.path.join(temp_dir, f'template.{template_ext}')
-            template_blob.download_to_filename(template_local_path)
-            print(f"[PROCESS] Downloaded template: {template_blob_path} -> {template_local_path}")
-            
+
             # Download PDF files
             pdf_blob_paths = request_data.get('pdf_blob_paths', [])
             if not pdf_blob_paths:
                 raise RuntimeError("PDF blob paths not found in request")
-            
-            pdf_bytes_list = []
-            for pdf_blob_path in pdf_blob_paths:
-                pdf_blob = bucket.blob(pdf_blob_path)
-                if not pdf_blob.exists():
-                    print(f"[PROCESS] Warning: PDF file not found in storage: {pdf_blob_path}, skipping")
-                    continue
-                
-                pdf_bytes = pdf_blob.download_as_bytes()
-                # Extract original filename from blob path (remove prefix like "pdf_1_")
-                filename = os.path.basename(pdf_blob_path)
-                # If filename starts with "pdf_", try to extract original name
-                if filename.startswith('pdf_') and '_' in filename:
-                    # Remove "pdf_X_" prefix
-                    parts = filename.split('_', 2)
-                    if len(parts) >= 3:
-                        filename = parts[2]
-                pdf_bytes_list.append((filename, pdf_bytes))
-                print(f"[PROCESS] Downloaded PDF: {filename} ({len(pdf_bytes)} bytes)")
-            
+
+            # Without Gemini the solution is a placeholder that never reads the PDFs,
+            # so they are neither downloaded nor parsed
+            use_gemini = bool(GOOGLE_API_KEY) and GENAI_AVAILABLE
+
+            # Update status to processing and download the template alongside the PDFs;
+            # the Firestore and storage clients are thread-safe
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                status_future = executor.submit(request_ref.update, {
+                    'status': 'processing',
+                    'updated_at': SERVER_TIMESTAMP
+                })
+                template_future = executor.submit(
+                    _download_template, bucket, template_blob_path, template_local_path
+                )
+                pdf_bytes_list = _download_pdfs(bucket, pdf_blob_paths) if use_gemini else None
+                status_future.result()
+                print(f"[PROCESS] Updated status to 'processing'")
+                template_future.result()
+            print(f"[PROCESS] Downloaded template: {template_blob_path} -> {template_local_path}")
+
             # Step 1: Convert template Excel to JSON
             print(f"[PROCESS] Step 1: Converting template to JSON...")
             template_json = excel_to_json(template_local_path)
             print(f"[PROCESS] Template has {len(template_json)} rows")
             
-            # Step 2: Parse PDFs
-            print(f"[PROCESS] Step 2: Parsing PDFs...")
-            pdf_data = parse_pdfs_from_bytes(pdf_bytes_list)
-            print(f"[PROCESS] Parsed {len(pdf_data)} PDFs")
+            # Step 2: No local PDF parsing; Gemini reads the PDF files directly
+            if use_gemini:
+                print(f"[PROCESS] Step 2: Skipping PDF parsing, PDFs are sent to Gemini as files")
+            else:
+                print(f"[PROCESS] Step 2: Skipping PDFs, Gemini is not configured (GOOGLE_API_KEY / google-genai)")
             
             # Step 3: Generate solution JSON
             print(f"[PROCESS] Step 3: Generating solution using LLM...")
-            generated_json = generate_solution_from_template_and_pdfs(template_json, pdf_data)
+            generated_json = generate_solution_from_template_and_pdfs(
+                template_json, pdf_files=pdf_bytes_list
+            )
             print(f"[PROCESS] Generated solution with {len(generated_json)} rows")
             
             # Step 4: Convert solution JSON to Excel
             print(f"[PROCESS] Step 4: Converting solution to Excel...")
-            solution_local_path = os.path.join(temp_dir, 'solution.xlsx')
-            json_to_excel_template(generated_json, template_local_path, solution_local_path)
+            solution_buffer = json_to_excel_template_bytes(
+                generated_json, template_local_path, preserve_formatting=PRESERVE_TEMPLATE_FORMATTING
+            )
             print(f"[PROCESS] Created solution Excel file")
             
             # Step 5: Upload solution.xlsx to Storage
             print(f"[PROCESS] Step 5: Uploading solution to Storage...")
             solution_blob_path = f"{request_id}/solution.xlsx"
             solution_blob = bucket.blob(solution_blob_path)
-            solution_blob.upload_from_filename(solution_local_path, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+            solution_blob.upload_from_file(
+                solution_buffer,
+                rewind=True,
+                content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            )
             print(f"[PROCESS] Uploaded solution to: {solution_blob_path}")
             
             # Step 6: Update Firestore status to completed
             print(f"[PROCESS] Step 6: Updating Firestore status...")
-            request_ref.update({
+            # Commit every completion field in a single batched write
+            batch = firestore_client.batch()
+            batch.update(request_ref, {
                 'status': 'completed',
                 'solution_blob_path': solution_blob_path,
-                'updated_at': datetime.utcnow()
+                'has_output': True,
+                'solution_size': solution_blob.size,
+                'error': DELETE_FIELD,
+                'updated_at': SERVER_TIMESTAMP
             })
+            batch.commit()
             print(f"[PROCESS] Successfully completed processing for request: {request_id}")
             
     except Exception as e:
@@ -644,7 +895,7 @@ def process_request(request_id: str):
             request_ref.update({
                 'status': 'failed',
                 'error': str(e),
-                'updated_at': datetime.utcnow()
+                'updated_at': SERVER_TIMESTAMP
             })
         except:
             pass
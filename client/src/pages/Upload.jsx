@@ -86,7 +86,8 @@ function Upload({ user }) {
     try {
       const response = await fetch(`${VITE_APP_API_URL}/api/requests/${requestId}/download`, {
         headers: {
-          'Authorization': `Bearer ${user.token}`
+          'Authorization': `Bearer ${user.token}`,
+          'Accept': 'application/json'
         }
       });
 
@@ -95,14 +96,13 @@ function Upload({ user }) {
         throw new Error(errorData.error || errorData.details || 'Failed to download file');
       }
 
-      const blob = await response.blob();
-      const url = window.URL.createObjectURL(blob);
+      // The server returns a short-lived signed URL; the browser downloads from storage directly
+      const { url } = await response.json();
       const a = document.createElement('a');
       a.href = url;
       a.download = `solution_${requestId}.xlsx`;
       document.body.appendChild(a);
       a.click();
-      window.URL.revokeObjectURL(url);
       document.body.removeChild(a);
     } catch (err) {
       setError(err.message || 'Failed to download file');
@@ -115,6 +115,39 @@ function Upload({ user }) {
     }
   };
 
+  // Follow a request's status over Server-Sent Events until it finishes; the
+  // 30 second list refresh still covers anything this misses
+  const watchRequest = async (requestId) => {
+    try {
+      const response = await fetch(`${VITE_APP_API_URL}/api/requests/${requestId}/stream`, {
+        headers: {
+          'Authorization': `Bearer ${user.token}`
+        }
+      });
+      if (!response.ok || !response.body) return;
+
+      const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+      let buffer = '';
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += value;
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const event of events) {
+          const dataLine = event.split('\n').find(line => line.startsWith('data: '));
+          if (!dataLine || event.startsWith('event: deleted')) continue;
+          const data = JSON.parse(dataLine.slice('data: '.length));
+          setRequests(prev => prev.map(req =>
+            req.requestId === requestId ? { ...req, ...data } : req
+          ));
+        }
+      }
+    } catch (err) {
+      console.error('Failed to watch request:', err);
+    }
+  };
+
   const handleTemplateChange = (e) => {
     const file = e.target.files[0];
     if (file) {
@@ -185,10 +218,13 @@ function Upload({ user }) {
       
       // Trigger Cloud Run job
       try {
+        // Pass on the owner proof from the extract response so the server can skip re-reading the request
+        const ownerProof = response.headers.get('X-Owner-Proof');
         const triggerResponse = await fetch(`${VITE_APP_API_URL}/api/requests/${data.requestId}/trigger`, {
           method: 'POST',
           headers: {
-            'Authorization': `Bearer ${user.token}`
+            'Authorization': `Bearer ${user.token}`,
+            ...(ownerProof && { 'X-Owner-Proof': ownerProof })
           }
         });
 
@@ -198,6 +234,7 @@ function Upload({ user }) {
           // Don't fail the whole request, just log the error
         } else {
           console.log('Cloud Run job triggered successfully');
+          watchRequest(data.requestId);
         }
       } catch (triggerErr) {
         console.error('Error triggering Cloud Run job:', triggerErr);
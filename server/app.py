@@ -1,29 +1,128 @@
-from flask import Flask, jsonify, request, Response
+from flask import Flask, Request, jsonify, redirect, request, Response
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
-from datetime import datetime
-from functools import wraps
+from flask_compress import Compress
+from datetime import datetime, timedelta, timezone
+from functools import wraps, lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from werkzeug.exceptions import HTTPException
 from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
 from google.cloud import firestore
+from google.cloud.firestore import FieldFilter
 from google.cloud import storage
-from google.cloud import run_v2
-from google.cloud.run_v2.types import RunJobRequest, EnvVar
+from google.cloud.storage import transfer_manager
 from google.oauth2 import service_account
+import atexit
+import itertools
 import json
+import logging
+import logging.handlers
+import orjson
+import re
 import os
+import queue
 import socket
+import tempfile
+import hashlib
+import hmac
+import threading
+import time
+import requests
+from urllib3.util import connection as urllib3_connection
+from cachecontrol import CacheControl
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Forcing IPv4
-_original_getaddrinfo = socket.getaddrinfo
-def force_ipv4_getaddrinfo(host, port, family=0, type=0, proto=0, flags=0):
-    return _original_getaddrinfo(host, port, socket.AF_INET, type, proto, flags)
-socket.getaddrinfo = force_ipv4_getaddrinfo
+# Leveled logging; set LOG_LEVEL=DEBUG for the verbose per-request trace
+logger = logging.getLogger("ats")
+logger.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+# Request threads only enqueue records; a background listener does the writing
+_log_queue = queue.SimpleQueue()
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+logger.propagate = False
+
+# Forcing IPv4 for HTTP connections to Google hosts (Storage, OAuth certs) through
+# urllib3's address family hook rather than patching socket.getaddrinfo for the
+# whole process; other hosts keep urllib3's default and can use IPv6.
+# gRPC (Firestore, Cloud Run) resolves in C and never went through the patch.
+IPV4_ONLY_HOST_SUFFIXES = ('.googleapis.com', '.google.com', '.firebaseio.com')
+_ipv4_only = threading.local()
+_default_gai_family = urllib3_connection.allowed_gai_family
+_default_create_connection = urllib3_connection.create_connection
+
+def _allowed_gai_family():
+    return socket.AF_INET if getattr(_ipv4_only, 'active', False) else _default_gai_family()
+
+def _create_connection(address, *args, **kwargs):
+    host = address[0]
+    _ipv4_only.active = isinstance(host, str) and host.endswith(IPV4_ONLY_HOST_SUFFIXES)
+    try:
+        return _default_create_connection(address, *args, **kwargs)
+    finally:
+        _ipv4_only.active = False
+
+urllib3_connection.allowed_gai_family = _allowed_gai_family
+urllib3_connection.create_connection = _create_connection
+
+def _json_default(obj):
+    # orjson encodes plain datetimes itself but not subclasses such as
+    # Firestore's DatetimeWithNanoseconds
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson for faster, compact responses."""
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_json_default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response instead of decoding to str and re-encoding
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+        return self._app.response_class(body, mimetype="application/json")
 
 app = Flask(__name__)
-CORS(app)
+app.json = OrjsonProvider(app)
+CORS(app, expose_headers=['X-Owner-Proof'])
+
+# Compress JSON responses; the solution .xlsx is already a zip archive
+app.config['COMPRESS_MIMETYPES'] = ['application/json']
+app.config['COMPRESS_LEVEL'] = 5
+Compress(app)
+
+# Reject oversized uploads before the multipart body is spooled
+MAX_UPLOAD_MB = int(os.environ.get("MAX_UPLOAD_MB", "100"))
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_MB * 1024 * 1024
+
+# Uploaded files up to this size stay in memory instead of spilling to a temp file
+UPLOAD_SPOOL_MAX_BYTES = 5 * 1024 * 1024
+
+# Files at least this large are uploaded to storage as parallel chunks (XML multipart)
+PARALLEL_UPLOAD_MIN_BYTES = 32 * 1024 * 1024
+# Chunk size for parallel and resumable uploads; a failed chunk is retried on its own
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+class SpooledRequest(Request):
+    """Request that spools each uploaded file in memory up to UPLOAD_SPOOL_MAX_BYTES."""
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        if total_content_length is not None and total_content_length >= PARALLEL_UPLOAD_MIN_BYTES:
+            # Parallel chunk uploads read the file by path, so big bodies get named files
+            return tempfile.NamedTemporaryFile(mode='rb+')
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_BYTES, mode='rb+')
+
+app.request_class = SpooledRequest
 
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID", "YOUR_GOOGLE_CLIENT_ID")
 FIREBASE_SERVICE_ACCOUNT = os.environ.get("FIREBASE_SERVICE_ACCOUNT")
@@ -32,33 +131,294 @@ STORAGE_BUCKET = os.environ.get("STORAGE_BUCKET")
 CLOUD_RUN_JOB_ID = os.environ.get("CLOUD_RUN_JOB_ID", "agentic-template-spreading-agent")
 CLOUD_RUN_LOCATION = os.environ.get("CLOUD_RUN_LOCATION", "us-central1")
 
-def get_firestore_client():
-    """Return Firestore client using service account JSON from env."""
+# Bucket name without any gs:// prefix
+BUCKET_NAME = (STORAGE_BUCKET or '').replace('gs://', '').strip()
+
+# Fully qualified name of the Cloud Run job started by /trigger
+JOB_NAME = f"projects/{PROJECT_ID}/locations/{CLOUD_RUN_LOCATION}/jobs/{CLOUD_RUN_JOB_ID}"
+
+# Number of Firestore clients to spread concurrent RPCs across
+FIRESTORE_POOL_SIZE = max(1, int(os.environ.get("FIRESTORE_POOL_SIZE", "4")))
+_firestore_rr = itertools.count()
+
+# Accepted upload file extensions
+TEMPLATE_EXTENSIONS = frozenset({'.xlsx', '.xls'})
+PDF_EXTENSION = '.pdf'
+# Every PDF starts with this marker; readers accept it anywhere in the first KiB
+PDF_MAGIC = b'%PDF-'
+PDF_HEADER_SCAN_BYTES = 1024
+
+# Storage permission failures on upload and the response returned for them
+PERMISSION_ERROR_RE = re.compile(r'403|forbidden|permission', re.IGNORECASE)
+STORAGE_PERMISSION_ERROR = {
+    "error": "Storage permission denied",
+    "message": (
+        f"The service account does not have permission to write to bucket '{STORAGE_BUCKET}'. "
+        "Please ensure the service account has 'Storage Admin' or 'Storage Object Creator' role "
+        "at the BUCKET level (not just project level). "
+        "Service account: ats-prod@agentic-template-spreading.iam.gserviceaccount.com"
+    ),
+    "details": "Go to Cloud Console > Cloud Storage > Buckets > agentic-template-spreading > Permissions and add the service account with Storage Admin role."
+}
+
+# Fields returned by GET /api/requests
+REQUEST_LIST_FIELDS = ['status', 'created_at', 'updated_at', 'template_filename', 'pdf_count', 'pdf_filenames', 'has_output']
+
+# Largest page GET /api/requests returns when paged with ?limit= (unpaged calls get everything)
+REQUEST_LIST_MAX_LIMIT = 200
+# Page tokens are request IDs, which are Firestore auto-IDs and never contain '/'
+PAGE_TOKEN_RE = re.compile(r'[A-Za-z0-9_-]{1,128}')
+
+# Partial-response field mask for solution lookups: only what the listing logs,
+# not the full object metadata
+SOLUTION_BLOB_FIELDS = "items(name,size,timeCreated,updated)"
+
+# From this many lookups on, solution files are found with one glob listing
+# instead of a listing per request
+SOLUTION_BATCH_LOOKUP_MIN = 8
+# Request IDs that can go into a match_glob alternation without escaping
+GLOB_SAFE_ID_RE = re.compile(r'[A-Za-z0-9_-]+')
+
+# Maximum number of blobs uploaded in parallel per request
+MAX_UPLOAD_WORKERS = 8
+
+# Threads for storage and Firestore lookups run alongside request handlers,
+# shared by all requests in a worker
+MAX_LOOKUP_WORKERS = 16
+
+# Lifetime of the signed URLs handed out for solution downloads
+SIGNED_URL_EXPIRATION = timedelta(minutes=5)
+
+# Shared pool for the per-request legacy solution lookups
+_io_executor = ThreadPoolExecutor(max_workers=MAX_LOOKUP_WORKERS, thread_name_prefix="ats-io")
+
+@lru_cache(maxsize=1)
+def get_service_account_credentials():
+    """Return service account credentials parsed once from the env JSON."""
+    return service_account.Credentials.from_service_account_info(
+        json.loads(FIREBASE_SERVICE_ACCOUNT)
+    )
+
+@lru_cache(maxsize=1)
+def _get_firestore_clients():
+    """Build the pool of Firestore clients, all sharing one set of credentials."""
     if not FIREBASE_SERVICE_ACCOUNT or not PROJECT_ID:
         raise RuntimeError("FIREBASE_SERVICE_ACCOUNT or PROJECT_ID env var not set")
 
-    credentials = service_account.Credentials.from_service_account_info(
-        json.loads(FIREBASE_SERVICE_ACCOUNT)
+    credentials = get_service_account_credentials()
+    return tuple(
+        firestore.Client(credentials=credentials, project=PROJECT_ID, database='ats-db')
+        for _ in range(FIRESTORE_POOL_SIZE)
     )
-    return firestore.Client(credentials=credentials, project=PROJECT_ID, database='ats-db')
 
+def get_firestore_client():
+    """Return a Firestore client from the pool, round-robin across its gRPC channels."""
+    clients = _get_firestore_clients()
+    return clients[next(_firestore_rr) % len(clients)]
+
+@lru_cache(maxsize=1)
 def get_storage_client():
     """Return Firebase Storage client using service account JSON from env."""
     if not FIREBASE_SERVICE_ACCOUNT or not STORAGE_BUCKET:
         raise RuntimeError("FIREBASE_SERVICE_ACCOUNT or STORAGE_BUCKET env var not set")
     
-    credentials = service_account.Credentials.from_service_account_info(
-        json.loads(FIREBASE_SERVICE_ACCOUNT)
-    )
+    credentials = get_service_account_credentials()
     client = storage.Client(credentials=credentials, project=PROJECT_ID)
     
     # Log service account email for debugging
     service_account_email = credentials.service_account_email
-    print(f"[STORAGE] Initialized storage client with service account: {service_account_email}")
-    print(f"[STORAGE] Project ID: {PROJECT_ID}, Bucket: {STORAGE_BUCKET}")
+    logger.info("[STORAGE] Initialized storage client with service account: %s", service_account_email)
+    logger.info("[STORAGE] Project ID: %s, Bucket: %s", PROJECT_ID, STORAGE_BUCKET)
     
     return client
 
+@lru_cache(maxsize=1)
+def get_bucket():
+    """Return the storage bucket handle, built once per process."""
+    return get_storage_client().bucket(BUCKET_NAME)
+
+@lru_cache(maxsize=1)
+def get_run_client():
+    """Return Cloud Run Jobs client; run_v2 is imported on first use to keep app import fast."""
+    from google.cloud import run_v2
+    
+    return run_v2.JobsClient(credentials=get_service_account_credentials())
+
+def _find_solution_blob(bucket, request_id):
+    """Return the solution blob for a request, with metadata, or None if it doesn't exist."""
+    blob_path = f"{request_id}/solution.xlsx"
+    for blob in bucket.list_blobs(prefix=blob_path, max_results=1, fields=SOLUTION_BLOB_FIELDS):
+        if blob.name == blob_path:
+            return blob
+    return None
+
+def _find_solution_blobs(bucket, request_ids):
+    """Return {request_id: solution blob} for the requests that have one, with a single listing."""
+    ids = sorted(request_ids)
+    # The offsets keep the scan within the range of the requested folders
+    blobs = bucket.list_blobs(
+        match_glob="{" + ",".join(ids) + "}/solution.xlsx",
+        start_offset=f"{ids[0]}/",
+        end_offset=f"{ids[-1]}0",
+        fields=f"{SOLUTION_BLOB_FIELDS},nextPageToken",
+    )
+    return {blob.name.split('/', 1)[0]: blob for blob in blobs}
+
+def _upload_payload(bucket, blob_name, payload, size, content_type):
+    """Upload bytes or a file positioned at its start to a blob and return the elapsed time in seconds."""
+    start = time.time()
+    blob = bucket.blob(blob_name)
+    if isinstance(payload, bytes):
+        blob.upload_from_string(payload, content_type=content_type)
+    elif size >= PARALLEL_UPLOAD_MIN_BYTES and isinstance(getattr(payload, 'name', None), str):
+        transfer_manager.upload_chunks_concurrently(
+            payload.name,
+            blob,
+            content_type=content_type,
+            chunk_size=UPLOAD_CHUNK_SIZE,
+            worker_type=transfer_manager.THREAD,
+            max_workers=MAX_UPLOAD_WORKERS,
+        )
+    else:
+        if size > UPLOAD_CHUNK_SIZE:
+            # Resumable session in fixed-size chunks, so a network error only resends one chunk
+            blob.chunk_size = UPLOAD_CHUNK_SIZE
+        blob.upload_from_file(payload, size=size, rewind=False, content_type=content_type)
+    return time.time() - start
+
+# Recently read extraction_requests documents; status endpoints are polled, so a
+# few seconds of staleness saves a Firestore read on most calls
+REQUEST_DOC_CACHE_TTL_SECONDS = 3
+_request_doc_cache = TTLCache(maxsize=10_000, ttl=REQUEST_DOC_CACHE_TTL_SECONDS)
+# IDs are only handed out once the document is written, so a missing one stays
+# missing and can be remembered longer
+MISSING_REQUEST_DOC_CACHE_TTL_SECONDS = 60
+_missing_request_docs = TTLCache(maxsize=10_000, ttl=MISSING_REQUEST_DOC_CACHE_TTL_SECONDS)
+_request_doc_cache_lock = threading.Lock()
+
+def get_request_doc(request_id):
+    """Return the extraction request document as a dict, or None if it doesn't exist."""
+    with _request_doc_cache_lock:
+        if request_id in _missing_request_docs:
+            return None
+        data = _request_doc_cache.get(request_id)
+    if data is not None:
+        return data
+    
+    doc = get_firestore_client().collection('extraction_requests').document(request_id).get()
+    if not doc.exists:
+        with _request_doc_cache_lock:
+            _missing_request_docs[request_id] = True
+        return None
+    data = doc.to_dict()
+    with _request_doc_cache_lock:
+        _request_doc_cache[request_id] = data
+    return data
+
+def invalidate_request_doc(request_id):
+    """Drop a cached extraction request document after it has been changed."""
+    with _request_doc_cache_lock:
+        _request_doc_cache.pop(request_id, None)
+
+# Live status streams: one Firestore listener per watched request, shared by every
+# /stream subscriber in this worker. Streams close at a final status or after
+# STATUS_STREAM_MAX_SECONDS, since with gthread workers each open stream holds a thread.
+STATUS_STREAM_MAX_SECONDS = 15 * 60
+STATUS_STREAM_HEARTBEAT_SECONDS = 15
+# Open streams allowed per worker, so they can't take every thread; past it /stream
+# answers 503 and the client keeps polling (gunicorn.conf.py sizes it to the worker)
+STATUS_STREAM_MAX_PER_WORKER = int(os.environ.get("STATUS_STREAM_MAX_PER_WORKER", "2"))
+_status_stream_slots = threading.BoundedSemaphore(STATUS_STREAM_MAX_PER_WORKER)
+FINAL_STATUSES = frozenset({'complete', 'completed', 'failed', 'error'})
+_status_watches = {}
+_status_watches_lock = threading.Lock()
+# Marks a watch whose listener hasn't delivered its first snapshot yet
+# (None already means the document was deleted)
+_NO_SNAPSHOT = object()
+
+def _subscribe_status(request_id):
+    """Return a queue that receives the request's document dict (or None once deleted) on every change."""
+    subscriber = queue.Queue()
+    with _status_watches_lock:
+        entry = _status_watches.get(request_id)
+        if entry is not None:
+            entry['subscribers'].add(subscriber)
+            # The listener only fires on changes, so a late subscriber starts from the last snapshot
+            if entry['latest'] is not _NO_SNAPSHOT:
+                subscriber.put(entry['latest'])
+            return subscriber
+        
+        entry = {'subscribers': {subscriber}, 'latest': _NO_SNAPSHOT}
+        
+        def on_snapshot(docs, changes, read_time):
+            data = docs[0].to_dict() if docs and docs[0].exists else None
+            # Listener updates keep the polling endpoints' cache fresh too
+            with _request_doc_cache_lock:
+                if data is not None:
+                    _request_doc_cache[request_id] = data
+                else:
+                    _request_doc_cache.pop(request_id, None)
+            with _status_watches_lock:
+                entry['latest'] = data
+                targets = list(entry['subscribers'])
+            for target in targets:
+                target.put(data)
+        
+        doc_ref = get_firestore_client().collection('extraction_requests').document(request_id)
+        entry['watch'] = doc_ref.on_snapshot(on_snapshot)
+        _status_watches[request_id] = entry
+    return subscriber
+
+def _unsubscribe_status(request_id, subscriber):
+    """Detach a subscriber, closing the Firestore listener when it was the last one."""
+    with _status_watches_lock:
+        entry = _status_watches[request_id]
+        entry['subscribers'].discard(subscriber)
+        if entry['subscribers']:
+            return
+        del _status_watches[request_id]
+    entry['watch'].unsubscribe()
+
+# Legacy completed requests (no has_output field) whose solution.xlsx was recently
+# found missing, so repeated polls skip the GCS probe
+MISSING_SOLUTION_CACHE_TTL_SECONDS = 5
+_missing_solution_cache = TTLCache(maxsize=50_000, ttl=MISSING_SOLUTION_CACHE_TTL_SECONDS)
+_missing_solution_cache_lock = threading.Lock()
+
+# Owner proofs: an HMAC over (request_id, email, expiry) handed out by /api/extract
+# and the status endpoint, so /trigger can check ownership without reading the
+# document. Without OWNER_PROOF_SECRET each worker uses its own random key, and a
+# proof from another worker just falls back to the document check.
+OWNER_PROOF_HEADER = 'X-Owner-Proof'
+OWNER_PROOF_TTL_SECONDS = 600
+OWNER_PROOF_SECRET = os.environ.get("OWNER_PROOF_SECRET", "").encode() or os.urandom(32)
+
+def _owner_proof_digest(request_id, email, expires):
+    message = f"{request_id}|{email}|{expires}".encode()
+    return hmac.new(OWNER_PROOF_SECRET, message, hashlib.sha256).hexdigest()
+
+def make_owner_proof(request_id, email):
+    """Return a proof that email owns request_id, valid for OWNER_PROOF_TTL_SECONDS."""
+    expires = int(time.time()) + OWNER_PROOF_TTL_SECONDS
+    return f"{expires}.{_owner_proof_digest(request_id, email, expires)}"
+
+def verify_owner_proof(proof, request_id, email):
+    """Check a proof from make_owner_proof; False if it is missing, forged or expired."""
+    expires, _, digest = (proof or '').partition('.')
+    if not expires.isdigit() or int(expires) < time.time():
+        return False
+    return hmac.compare_digest(digest, _owner_proof_digest(request_id, email, int(expires)))
+
+# Verified ID tokens, keyed by a 128-bit BLAKE2b digest of the token so raw tokens are never stored
+TOKEN_CACHE_TTL_SECONDS = 300
+TOKEN_CACHE_MARGIN_SECONDS = 10
+_token_cache = TTLCache(maxsize=10_000, ttl=TOKEN_CACHE_TTL_SECONDS)
+_token_cache_lock = threading.Lock()
+
+# Shared transport for fetching Google's signing certs, with HTTP caching
+# so the certs are only re-downloaded when their Cache-Control expires
+_google_request = google_requests.Request(session=CacheControl(requests.Session()))
+
 # Token verification decorator
 def require_token(f):
     @wraps(f)
@@ -66,36 +426,58 @@ def require_token(f):
         auth_header = request.headers.get('Authorization')
         
         if not auth_header or not auth_header.startswith('Bearer '):
-            print(f"[AUTH] Missing or invalid Authorization header from {request.remote_addr}")
+            logger.warning("[AUTH] Missing or invalid Authorization header from %s", request.remote_addr)
             return jsonify({"error": "Missing or invalid token"}), 401
         
         token = auth_header.split(' ')[1]
+        token_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
         
         try:
-            idinfo = id_token.verify_oauth2_token(
-                token,
-                google_requests.Request(),
-                GOOGLE_CLIENT_ID,
-                clock_skew_in_seconds=10
-            )
-            request.user_email = idinfo.get('email')
+            with _token_cache_lock:
+                user_info = _token_cache.get(token_key)
+            if user_info is None or user_info['exp'] - TOKEN_CACHE_MARGIN_SECONDS <= time.time():
+                idinfo = id_token.verify_oauth2_token(
+                    token,
+                    _google_request,
+                    GOOGLE_CLIENT_ID,
+                    clock_skew_in_seconds=10
+                )
+                user_info = {
+                    "email": idinfo.get('email'),
+                    "name": idinfo.get('name'),
+                    "avatar": idinfo.get('picture'),
+                    "exp": idinfo.get('exp', 0)
+                }
+                # Never outlive the token itself
+                if user_info['exp'] - TOKEN_CACHE_MARGIN_SECONDS > time.time():
+                    with _token_cache_lock:
+                        _token_cache[token_key] = user_info
+                logger.info("[AUTH] Token verified successfully for user: %s", user_info['email'])
+            request.user_email = user_info['email']
             request.user_info = {
-                "email": idinfo.get('email'),
-                "name": idinfo.get('name'),
-                "avatar": idinfo.get('picture')
+                "email": user_info['email'],
+                "name": user_info['name'],
+                "avatar": user_info['avatar']
             }
-            print(f"[AUTH] Token verified successfully for user: {request.user_email}")
             return f(*args, **kwargs)
+        except HTTPException:
+            # Raised by the wrapped handler (e.g. 413 on an oversized body), not by verification
+            raise
         except Exception as e:
-            print(f"[AUTH] Token verification failed: {e}")
+            logger.warning("[AUTH] Token verification failed: %s", e)
             return jsonify({"error": "Invalid token"}), 401
     
     return decorated_function
 
+@app.errorhandler(413)
+def request_too_large(e):
+    logger.warning("[APP] Rejected request larger than %s MB from %s", MAX_UPLOAD_MB, request.remote_addr)
+    return jsonify({"error": f"Upload exceeds the {MAX_UPLOAD_MB} MB limit"}), 413
+
 # Health check route
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    print(f"[GET /api/health] Health check request")
+    logger.debug("[GET /api/health] Health check request")
     return jsonify({'status': 'healthy'})
 
 # PDF Extraction to Template endpoint
@@ -105,332 +487,305 @@ def create_extraction_request():
     """Create a request in Firestore and upload files to Firebase Storage."""
     import time
     start_time = time.time()
-    request_timestamp = datetime.utcnow().isoformat()
     
     try:
         email = request.user_email
-        user_info = request.user_info
-        remote_addr = request.remote_addr
-        user_agent = request.headers.get('User-Agent', 'Unknown')
-        content_type = request.headers.get('Content-Type', 'Unknown')
-        
-        print(f"[POST /api/extract] ========== EXTRACT REQUEST START ==========")
-        print(f"[POST /api/extract] Timestamp: {request_timestamp}")
-        print(f"[POST /api/extract] User email: {email}")
-        print(f"[POST /api/extract] User name: {user_info.get('name', 'N/A')}")
-        print(f"[POST /api/extract] Remote address: {remote_addr}")
-        print(f"[POST /api/extract] User-Agent: {user_agent}")
-        print(f"[POST /api/extract] Content-Type: {content_type}")
-        print(f"[POST /api/extract] Request method: {request.method}")
-        print(f"[POST /api/extract] Request URL: {request.url}")
-        
-        # Log all form fields (excluding file data)
-        print(f"[POST /api/extract] Form fields present: {list(request.form.keys())}")
-        for key in request.form.keys():
-            print(f"[POST /api/extract] Form field '{key}': {request.form[key]}")
+        
+        logger.info("[POST /api/extract] ========== EXTRACT REQUEST START ==========")
+        # Request details and form fields (excluding file data) are only gathered at DEBUG
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[POST /api/extract] Timestamp: %s", datetime.now(timezone.utc).isoformat())
+            logger.debug("[POST /api/extract] User email: %s", email)
+            logger.debug("[POST /api/extract] User name: %s", request.user_info.get('name', 'N/A'))
+            logger.debug("[POST /api/extract] Remote address: %s", request.remote_addr)
+            logger.debug("[POST /api/extract] User-Agent: %s", request.headers.get('User-Agent', 'Unknown'))
+            logger.debug("[POST /api/extract] Content-Type: %s", request.headers.get('Content-Type', 'Unknown'))
+            logger.debug("[POST /api/extract] Request method: %s", request.method)
+            logger.debug("[POST /api/extract] Request URL: %s", request.url)
+            logger.debug("[POST /api/extract] Form fields present: %s", list(request.form.keys()))
+            for key in request.form.keys():
+                logger.debug("[POST /api/extract] Form field '%s': %s", key, request.form[key])
         
         # Check if files are present
-        print(f"[POST /api/extract] Checking for template file in request...")
+        logger.debug("[POST /api/extract] Checking for template file in request...")
         if 'template' not in request.files:
-            print(f"[POST /api/extract] ERROR: Template file missing from request")
-            print(f"[POST /api/extract] Available files in request: {list(request.files.keys())}")
+            logger.error("[POST /api/extract] ERROR: Template file missing from request")
+            logger.debug("[POST /api/extract] Available files in request: %s", list(request.files.keys()))
             return jsonify({"error": "Template file is required"}), 400
         
         template_file = request.files['template']
-        print(f"[POST /api/extract] Template file received: filename='{template_file.filename}', content_type='{template_file.content_type}'")
+        logger.debug("[POST /api/extract] Template file received: filename='%s', content_type='%s'", template_file.filename, template_file.content_type)
         
         if template_file.filename == '':
-            print(f"[POST /api/extract] ERROR: Template filename is empty")
+            logger.error("[POST /api/extract] ERROR: Template filename is empty")
             return jsonify({"error": "Template file is required"}), 400
         
-        # Get file size for template
-        template_file.seek(0, 2)  # Seek to end
-        template_size = template_file.tell()
-        template_file.seek(0)  # Reset to beginning
-        print(f"[POST /api/extract] Template file size: {template_size} bytes ({template_size / 1024:.2f} KB)")
-        
-        # Check file extension for template (should be Excel)
-        template_ext = template_file.filename.lower().split('.')[-1] if '.' in template_file.filename else ''
-        print(f"[POST /api/extract] Template file extension: '{template_ext}'")
-        if not template_file.filename.lower().endswith(('.xlsx', '.xls')):
-            print(f"[POST /api/extract] ERROR: Invalid template file extension '{template_ext}'")
+        # Check file extension for template (should be Excel) before touching the body
+        template_ext = os.path.splitext(template_file.filename)[1].lower()
+        logger.debug("[POST /api/extract] Template file extension: '%s'", template_ext)
+        if template_ext not in TEMPLATE_EXTENSIONS:
+            logger.error("[POST /api/extract] ERROR: Invalid template file extension '%s'", template_ext)
             return jsonify({"error": "Template must be an Excel file (.xlsx or .xls)"}), 400
         
+        # Get file size for template; seek() returns the new position, so no tell() is needed
+        template_size = template_file.stream.seek(0, 2)
+        template_file.stream.seek(0)
+        logger.debug("[POST /api/extract] Template file size: %s bytes (%.2f KB)", template_size, template_size / 1024)
+        
         # Get PDF files
-        print(f"[POST /api/extract] Retrieving PDF files from request...")
+        logger.debug("[POST /api/extract] Retrieving PDF files from request...")
         pdf_files = request.files.getlist('pdfs')
-        print(f"[POST /api/extract] Number of PDF files received: {len(pdf_files) if pdf_files else 0}")
+        logger.debug("[POST /api/extract] Number of PDF files received: %s", len(pdf_files) if pdf_files else 0)
         
         if not pdf_files or len(pdf_files) == 0:
-            print(f"[POST /api/extract] ERROR: No PDF files found in request")
+            logger.error("[POST /api/extract] ERROR: No PDF files found in request")
             return jsonify({"error": "At least one PDF file is required"}), 400
         
-        # Check all PDFs have valid filenames and log details
-        total_pdf_size = 0
+        # Check all PDFs have valid filenames and PDF content before anything is uploaded
+        # (sizes are logged when they are read for upload)
         for idx, pdf in enumerate(pdf_files):
-            pdf.seek(0, 2)  # Seek to end
-            pdf_size = pdf.tell()
-            pdf.seek(0)  # Reset to beginning
-            total_pdf_size += pdf_size
-            print(f"[POST /api/extract] PDF {idx + 1}: filename='{pdf.filename}', size={pdf_size} bytes ({pdf_size / 1024:.2f} KB), content_type='{pdf.content_type}'")
+            logger.debug("[POST /api/extract] PDF %s: filename='%s', content_type='%s'", idx + 1, pdf.filename, pdf.content_type)
             
             if pdf.filename == '':
-                print(f"[POST /api/extract] ERROR: PDF {idx + 1} has empty filename")
+                logger.error("[POST /api/extract] ERROR: PDF %s has empty filename", idx + 1)
                 return jsonify({"error": "All PDF files must have valid filenames"}), 400
-            if not pdf.filename.lower().endswith('.pdf'):
-                print(f"[POST /api/extract] ERROR: PDF {idx + 1} has invalid extension: '{pdf.filename}'")
+            if os.path.splitext(pdf.filename)[1].lower() != PDF_EXTENSION:
+                logger.error("[POST /api/extract] ERROR: PDF %s has invalid extension: '%s'", idx + 1, pdf.filename)
+                return jsonify({"error": "All files must be PDFs"}), 400
+            pdf_header = pdf.stream.read(PDF_HEADER_SCAN_BYTES)
+            pdf.stream.seek(0)
+            if PDF_MAGIC not in pdf_header:
+                logger.error("[POST /api/extract] ERROR: PDF %s is not a PDF file: '%s'", idx + 1, pdf.filename)
                 return jsonify({"error": "All files must be PDFs"}), 400
         
-        print(f"[POST /api/extract] Total PDF files size: {total_pdf_size} bytes ({total_pdf_size / 1024:.2f} KB)")
-        print(f"[POST /api/extract] Total upload size: {template_size + total_pdf_size} bytes ({(template_size + total_pdf_size) / 1024:.2f} KB)")
+        logger.debug("[POST /api/extract] Total upload size: %s bytes", request.content_length)
         
-        # Initialize Firestore client
-        print(f"[POST /api/extract] Initializing Firestore client...")
-        firestore_start = time.time()
         client = get_firestore_client()
-        firestore_init_time = time.time() - firestore_start
-        print(f"[POST /api/extract] Firestore client initialized in {firestore_init_time:.3f}s")
-        print(f"[POST /api/extract] Firestore project: {PROJECT_ID}, database: ats-db")
+        logger.debug("[POST /api/extract] Firestore project: %s, database: ats-db", PROJECT_ID)
         
         requests_ref = client.collection('extraction_requests')
-        print(f"[POST /api/extract] Using Firestore collection: extraction_requests")
+        logger.debug("[POST /api/extract] Using Firestore collection: extraction_requests")
         
-        # Create document - Firestore will auto-generate ID
-        created_at = datetime.utcnow()
-        request_doc = {
-            'user_email': email,
-            'status': 'pending',
-            'created_at': created_at,
-            'updated_at': created_at,
-            'template_filename': template_file.filename,
-            'pdf_filenames': [pdf.filename for pdf in pdf_files],
-            'pdf_count': len(pdf_files)
-        }
-        print(f"[POST /api/extract] Creating Firestore document with data:")
-        print(f"[POST /api/extract]   - user_email: {request_doc['user_email']}")
-        print(f"[POST /api/extract]   - status: {request_doc['status']}")
-        print(f"[POST /api/extract]   - created_at: {request_doc['created_at']}")
-        print(f"[POST /api/extract]   - template_filename: {request_doc['template_filename']}")
-        print(f"[POST /api/extract]   - pdf_count: {request_doc['pdf_count']}")
-        print(f"[POST /api/extract]   - pdf_filenames: {request_doc['pdf_filenames']}")
-        
-        # Add document and get its ID
-        firestore_write_start = time.time()
-        _, doc_ref = requests_ref.add(request_doc)
-        firestore_write_time = time.time() - firestore_write_start
+        # Reserve a document ID locally (no RPC) so blob paths can be derived from it;
+        # the document itself is written once, after the uploads
+        doc_ref = requests_ref.document()
         request_id = doc_ref.id
-        print(f"[POST /api/extract] Firestore document created with ID: {request_id} in {firestore_write_time:.3f}s")
-        print(f"[POST /api/extract] Document path: {doc_ref.path}")
+        logger.info("[POST /api/extract] Reserved request ID: %s", request_id)
+        logger.debug("[POST /api/extract] Document path: %s", doc_ref.path)
         
         # Upload files to Firebase Storage
-        print(f"[POST /api/extract] ========== STORAGE UPLOAD START ==========")
-        print(f"[POST /api/extract] Storage bucket from env: {STORAGE_BUCKET}")
-        
-        storage_init_start = time.time()
-        storage_client = get_storage_client()
-        storage_init_time = time.time() - storage_init_start
-        print(f"[POST /api/extract] Storage client initialized in {storage_init_time:.3f}s")
-        
-        # Ensure bucket name doesn't have gs:// prefix
-        bucket_name = STORAGE_BUCKET.replace('gs://', '').strip()
-        print(f"[POST /api/extract] Normalized bucket name: {bucket_name}")
-        
-        bucket_access_start = time.time()
-        bucket = storage_client.bucket(bucket_name)
-        bucket_access_time = time.time() - bucket_access_start
-        print(f"[POST /api/extract] Bucket object retrieved in {bucket_access_time:.3f}s")
-        print(f"[POST /api/extract] Bucket name: {bucket.name}")
-        
-        # Upload template file
-        template_ext = template_file.filename.split('.')[-1]
-        template_blob_name = f"{request_id}/template.{template_ext}"
-        print(f"[POST /api/extract] Uploading template file...")
-        print(f"[POST /api/extract]   - Source filename: {template_file.filename}")
-        print(f"[POST /api/extract]   - Blob path: {template_blob_name}")
-        print(f"[POST /api/extract]   - File size: {template_size} bytes")
-        print(f"[POST /api/extract]   - Content type: {template_file.content_type or 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'}")
-        
-        template_blob = bucket.blob(template_blob_name)
-        
-        # Reset file pointer to beginning
-        template_file.seek(0)
-        template_upload_start = time.time()
-        template_blob.upload_from_file(
-            template_file, 
-            content_type=template_file.content_type or 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        template_upload_time = time.time() - template_upload_start
-        template_blob.reload()
-        print(f"[POST /api/extract] Template uploaded successfully in {template_upload_time:.3f}s")
-        print(f"[POST /api/extract]   - Blob size: {template_blob.size} bytes")
-        print(f"[POST /api/extract]   - Blob content type: {template_blob.content_type}")
-        print(f"[POST /api/extract]   - Blob created: {template_blob.time_created}")
-        
-        # Upload PDF files
-        print(f"[POST /api/extract] Uploading {len(pdf_files)} PDF file(s)...")
+        logger.info("[POST /api/extract] ========== STORAGE UPLOAD START ==========")
+        logger.debug("[POST /api/extract] Storage bucket: %s", BUCKET_NAME)
+        bucket = get_bucket()
+        
+        # Queue template file
+        template_blob_name = f"{request_id}/template{template_ext}"
+        template_content_type = template_file.content_type or 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        logger.debug("[POST /api/extract] Queued template file:")
+        logger.debug("[POST /api/extract]   - Source filename: %s", template_file.filename)
+        logger.debug("[POST /api/extract]   - Blob path: %s", template_blob_name)
+        logger.debug("[POST /api/extract]   - File size: %s bytes", template_size)
+        logger.debug("[POST /api/extract]   - Content type: %s", template_content_type)
+        
+        # The size probe left the template stream at its start, so it can be sent as-is;
+        # with the size known up front small files go as one multipart request
+        uploads = [(template_blob_name, template_file.stream, template_size, template_content_type)]
+        
+        # Queue PDF files
+        logger.info("[POST /api/extract] Uploading template and %s PDF file(s)...", len(pdf_files))
+        # Size each PDF with one seek, read small ones into memory and stream larger
+        # spooled ones straight from their file, then upload everything in parallel
         pdf_blob_names = []
-        total_pdf_upload_time = 0
-        
         for idx, pdf_file in enumerate(pdf_files):
-            pdf_file.seek(0, 2)
-            pdf_size = pdf_file.tell()
-            pdf_file.seek(0)
-            
+            pdf_size = pdf_file.stream.seek(0, 2)
+            pdf_file.stream.seek(0)
+            pdf_payload = pdf_file.stream.read() if pdf_size <= UPLOAD_SPOOL_MAX_BYTES else pdf_file.stream
             pdf_blob_name = f"{request_id}/pdf_{idx + 1}_{pdf_file.filename}"
-            print(f"[POST /api/extract] Uploading PDF {idx + 1}/{len(pdf_files)}...")
-            print(f"[POST /api/extract]   - Source filename: {pdf_file.filename}")
-            print(f"[POST /api/extract]   - Blob path: {pdf_blob_name}")
-            print(f"[POST /api/extract]   - File size: {pdf_size} bytes ({pdf_size / 1024:.2f} KB)")
-            
-            pdf_blob = bucket.blob(pdf_blob_name)
-            
-            # Reset file pointer to beginning
-            pdf_file.seek(0)
-            pdf_upload_start = time.time()
-            pdf_blob.upload_from_file(pdf_file, content_type='application/pdf')
-            pdf_upload_time = time.time() - pdf_upload_start
-            total_pdf_upload_time += pdf_upload_time
-            pdf_blob.reload()
-            
+            logger.debug("[POST /api/extract] Queued PDF %s/%s: %s -> %s (%.2f KB)", idx + 1, len(pdf_files), pdf_file.filename, pdf_blob_name, pdf_size / 1024)
             pdf_blob_names.append(pdf_blob_name)
-            print(f"[POST /api/extract] PDF {idx + 1} uploaded successfully in {pdf_upload_time:.3f}s")
-            print(f"[POST /api/extract]   - Blob size: {pdf_blob.size} bytes")
-            print(f"[POST /api/extract]   - Blob content type: {pdf_blob.content_type}")
-            print(f"[POST /api/extract]   - Blob created: {pdf_blob.time_created}")
+            uploads.append((pdf_blob_name, pdf_payload, pdf_size, 'application/pdf'))
         
-        print(f"[POST /api/extract] All PDFs uploaded in {total_pdf_upload_time:.3f}s (avg: {total_pdf_upload_time / len(pdf_files):.3f}s per file)")
-        print(f"[POST /api/extract] ========== STORAGE UPLOAD COMPLETE ==========")
+        upload_start = time.time()
+        with ThreadPoolExecutor(max_workers=min(MAX_UPLOAD_WORKERS, len(uploads))) as executor:
+            futures = {
+                executor.submit(_upload_payload, bucket, blob_name, payload, size, content_type): blob_name
+                for blob_name, payload, size, content_type in uploads
+            }
+            for future in as_completed(futures):
+                logger.debug("[POST /api/extract] Uploaded %s in %.3fs", futures[future], future.result())
+        upload_time = time.time() - upload_start
         
-        # Update Firestore document with blob paths
-        print(f"[POST /api/extract] Updating Firestore document with blob paths...")
-        update_data = {
+        logger.info("[POST /api/extract] Template and PDFs uploaded in %.3fs", upload_time)
+        logger.debug("[POST /api/extract] ========== STORAGE UPLOAD COMPLETE ==========")
+        
+        # Create the Firestore document, blob paths included, in a single write;
+        # timestamps are set by Firestore so they don't depend on this host's clock
+        request_doc = {
+            'user_email': email,
+            'status': 'pending',
+            'created_at': firestore.SERVER_TIMESTAMP,
+            'updated_at': firestore.SERVER_TIMESTAMP,
+            'template_filename': template_file.filename,
             'template_blob_path': template_blob_name,
+            'pdf_filenames': [pdf.filename for pdf in pdf_files],
             'pdf_blob_paths': pdf_blob_names,
-            'updated_at': datetime.utcnow()
+            'pdf_count': len(pdf_files),
+            'has_output': False
         }
-        print(f"[POST /api/extract] Update data:")
-        print(f"[POST /api/extract]   - template_blob_path: {update_data['template_blob_path']}")
-        print(f"[POST /api/extract]   - pdf_blob_paths: {update_data['pdf_blob_paths']}")
-        print(f"[POST /api/extract]   - updated_at: {update_data['updated_at']}")
+        logger.debug("[POST /api/extract] Creating Firestore document with data:")
+        logger.debug("[POST /api/extract]   - user_email: %s", request_doc['user_email'])
+        logger.debug("[POST /api/extract]   - status: %s", request_doc['status'])
+        logger.debug("[POST /api/extract]   - template_filename: %s", request_doc['template_filename'])
+        logger.debug("[POST /api/extract]   - template_blob_path: %s", request_doc['template_blob_path'])
+        logger.debug("[POST /api/extract]   - pdf_count: %s", request_doc['pdf_count'])
+        logger.debug("[POST /api/extract]   - pdf_filenames: %s", request_doc['pdf_filenames'])
+        logger.debug("[POST /api/extract]   - pdf_blob_paths: %s", request_doc['pdf_blob_paths'])
         
-        firestore_update_start = time.time()
-        doc_ref.update(update_data)
-        firestore_update_time = time.time() - firestore_update_start
-        print(f"[POST /api/extract] Firestore document updated in {firestore_update_time:.3f}s")
+        firestore_write_start = time.time()
+        doc_ref.set(request_doc)
+        firestore_write_time = time.time() - firestore_write_start
+        logger.info("[POST /api/extract] Firestore document created in %.3fs", firestore_write_time)
         
         total_time = time.time() - start_time
-        print(f"[POST /api/extract] ========== EXTRACT REQUEST SUCCESS ==========")
-        print(f"[POST /api/extract] Request ID: {request_id}")
-        print(f"[POST /api/extract] Total processing time: {total_time:.3f}s")
-        print(f"[POST /api/extract]   - Firestore init: {firestore_init_time:.3f}s")
-        print(f"[POST /api/extract]   - Firestore write: {firestore_write_time:.3f}s")
-        print(f"[POST /api/extract]   - Storage init: {storage_init_time:.3f}s")
-        print(f"[POST /api/extract]   - Template upload: {template_upload_time:.3f}s")
-        print(f"[POST /api/extract]   - PDF uploads: {total_pdf_upload_time:.3f}s")
-        print(f"[POST /api/extract]   - Firestore update: {firestore_update_time:.3f}s")
-        print(f"[POST /api/extract] ============================================")
+        logger.info("[POST /api/extract] ========== EXTRACT REQUEST SUCCESS ==========")
+        logger.info("[POST /api/extract] Request ID: %s", request_id)
+        logger.info("[POST /api/extract] Total processing time: %.3fs", total_time)
+        logger.debug("[POST /api/extract]   - Firestore write: %.3fs", firestore_write_time)
+        logger.debug("[POST /api/extract]   - Storage uploads: %.3fs", upload_time)
+        logger.debug("[POST /api/extract] ============================================")
         
         return jsonify({
             "requestId": request_id,
             "message": "Request created successfully",
             "status": "pending"
-        }), 201
+        }), 201, {OWNER_PROOF_HEADER: make_owner_proof(request_id, email)}
         
+    except HTTPException:
+        # e.g. RequestEntityTooLarge from reading request.files; let its error handler answer
+        raise
     except Exception as e:
         error_str = str(e)
         error_type = type(e).__name__
         total_time = time.time() - start_time
         
-        print(f"[POST /api/extract] ========== EXTRACT REQUEST ERROR ==========")
-        print(f"[POST /api/extract] Error type: {error_type}")
-        print(f"[POST /api/extract] Error message: {error_str}")
-        print(f"[POST /api/extract] Request failed after {total_time:.3f}s")
-        print(f"[POST /api/extract] User: {email if 'email' in locals() else 'Unknown'}")
-        print(f"[POST /api/extract] Request ID: {request_id if 'request_id' in locals() else 'Not created'}")
-        import traceback
-        print(f"[POST /api/extract] Traceback:")
-        traceback.print_exc()
-        print(f"[POST /api/extract] ===========================================")
+        logger.error("[POST /api/extract] ========== EXTRACT REQUEST ERROR ==========")
+        logger.error("[POST /api/extract] Error type: %s", error_type)
+        logger.error("[POST /api/extract] Error message: %s", error_str)
+        logger.error("[POST /api/extract] Request failed after %.3fs", total_time)
+        logger.error("[POST /api/extract] User: %s", email if 'email' in locals() else 'Unknown')
+        logger.error("[POST /api/extract] Request ID: %s", request_id if 'request_id' in locals() else 'Not created')
+        logger.exception("[POST /api/extract] Traceback:")
+        logger.debug("[POST /api/extract] ===========================================")
         
         # Check for specific permission errors
-        if "403" in error_str or "Forbidden" in error_str or "permission" in error_str.lower():
-            print(f"[POST /api/extract] Detected permission error - returning 403 response")
-            return jsonify({
-                "error": "Storage permission denied",
-                "message": (
-                    f"The service account does not have permission to write to bucket '{STORAGE_BUCKET}'. "
-                    "Please ensure the service account has 'Storage Admin' or 'Storage Object Creator' role "
-                    "at the BUCKET level (not just project level). "
-                    f"Service account: ats-prod@agentic-template-spreading.iam.gserviceaccount.com"
-                ),
-                "details": "Go to Cloud Console > Cloud Storage > Buckets > agentic-template-spreading > Permissions and add the service account with Storage Admin role."
-            }), 403
+        if PERMISSION_ERROR_RE.search(error_str):
+            logger.warning("[POST /api/extract] Detected permission error - returning 403 response")
+            return jsonify(STORAGE_PERMISSION_ERROR), 403
         
         return jsonify({"error": "Failed to create extraction request", "details": error_str}), 500
 
 @app.route('/api/requests', methods=['GET'])
 @require_token
 def get_user_requests():
-    """Get all extraction requests for the current user."""
+    """Get the current user's extraction requests, all of them or one page at a time."""
     import time
     start_time = time.time()
-    request_timestamp = datetime.utcnow().isoformat()
     
     try:
         email = request.user_email
-        user_info = request.user_info
-        remote_addr = request.remote_addr
-        user_agent = request.headers.get('User-Agent', 'Unknown')
-        
-        print(f"[GET /api/requests] ========== GET REQUESTS START ==========")
-        print(f"[GET /api/requests] Timestamp: {request_timestamp}")
-        print(f"[GET /api/requests] User email: {email}")
-        print(f"[GET /api/requests] User name: {user_info.get('name', 'N/A')}")
-        print(f"[GET /api/requests] Remote address: {remote_addr}")
-        print(f"[GET /api/requests] User-Agent: {user_agent}")
-        print(f"[GET /api/requests] Request method: {request.method}")
-        print(f"[GET /api/requests] Request URL: {request.url}")
-        print(f"[GET /api/requests] Query parameters: {dict(request.args)}")
-
-        # Initialize Firestore client
-        print(f"[GET /api/requests] Initializing Firestore client...")
-        firestore_start = time.time()
+        
+        limit = None
+        if 'limit' in request.args:
+            try:
+                limit = int(request.args['limit'])
+            except ValueError:
+                return jsonify({"error": "limit must be an integer"}), 400
+            if not 1 <= limit <= REQUEST_LIST_MAX_LIMIT:
+                return jsonify({"error": f"limit must be between 1 and {REQUEST_LIST_MAX_LIMIT}"}), 400
+        page_token = request.args.get('pageToken')
+        if page_token is not None and not PAGE_TOKEN_RE.fullmatch(page_token):
+            return jsonify({"error": "Invalid pageToken"}), 400
+        
+        logger.info("[GET /api/requests] ========== GET REQUESTS START ==========")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("[GET /api/requests] Timestamp: %s", datetime.now(timezone.utc).isoformat())
+            logger.debug("[GET /api/requests] User email: %s", email)
+            logger.debug("[GET /api/requests] User name: %s", request.user_info.get('name', 'N/A'))
+            logger.debug("[GET /api/requests] Remote address: %s", request.remote_addr)
+            logger.debug("[GET /api/requests] User-Agent: %s", request.headers.get('User-Agent', 'Unknown'))
+            logger.debug("[GET /api/requests] Request method: %s", request.method)
+            logger.debug("[GET /api/requests] Request URL: %s", request.url)
+            logger.debug("[GET /api/requests] Query parameters: %s", dict(request.args))
+
         client = get_firestore_client()
-        firestore_init_time = time.time() - firestore_start
-        print(f"[GET /api/requests] Firestore client initialized in {firestore_init_time:.3f}s")
-        print(f"[GET /api/requests] Firestore project: {PROJECT_ID}, database: ats-db")
+        logger.debug("[GET /api/requests] Firestore project: %s, database: ats-db", PROJECT_ID)
         
         requests_ref = client.collection('extraction_requests')
-        print(f"[GET /api/requests] Using Firestore collection: extraction_requests")
+        logger.debug("[GET /api/requests] Using Firestore collection: extraction_requests")
         
-        # Query requests for this user (without order_by to avoid index requirement)
-        # We'll sort in Python instead
-        print(f"[GET /api/requests] Querying requests for user: {email}")
+        # Query this user's requests (one page of them when limit is given), newest
+        # first, fetching only the listed fields (needs the composite index
+        # user_email ASC, created_at DESC)
+        logger.debug("[GET /api/requests] Querying requests for user: %s (limit=%s, pageToken=%s)", email, limit, page_token)
         query_start = time.time()
-        query = requests_ref.where('user_email', '==', email)
-        print(f"[GET /api/requests] Firestore query: collection('extraction_requests').where('user_email', '==', '{email}')")
-        docs = query.stream()
+        query = (
+            requests_ref.where(filter=FieldFilter('user_email', '==', email))
+            .order_by('created_at', direction=firestore.Query.DESCENDING)
+            .select(REQUEST_LIST_FIELDS)
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        if page_token:
+            # The page token is the id of the last request on the previous page
+            cursor = requests_ref.document(page_token).get(field_paths=['user_email', 'created_at'])
+            cursor_data = cursor.to_dict() if cursor.exists else None
+            if not cursor_data or cursor_data.get('user_email') != email or cursor_data.get('created_at') is None:
+                return jsonify({"error": "Invalid pageToken"}), 400
+            query = query.start_after(cursor)
+        logger.debug("[GET /api/requests] Firestore query: collection('extraction_requests').where('user_email', '==', '%s').order_by('created_at', DESCENDING), limit=%s", email, limit)
+        # to_dict() deep-copies the document, so convert each one only once
+        docs = [(doc, doc.to_dict()) for doc in query.stream()]
         query_time = time.time() - query_start
-        print(f"[GET /api/requests] Query executed in {query_time:.3f}s")
+        # A full page may have more after it
+        next_page_token = docs[-1][0].id if limit is not None and len(docs) == limit else None
+        logger.info("[GET /api/requests] Query executed in %.3fs", query_time)
         
-        # Check storage for solution files (only for completed requests)
-        print(f"[GET /api/requests] Initializing storage client for solution file checks...")
-        storage_client = None
+        # The agent records has_output when it uploads the solution, so storage is only
+        # checked for completed requests written before that field existed
         bucket = None
-        storage_init_time = 0
-        try:
-            storage_init_start = time.time()
-            storage_client = get_storage_client()
-            bucket_name = STORAGE_BUCKET.replace('gs://', '').strip()
-            bucket = storage_client.bucket(bucket_name)
-            storage_init_time = time.time() - storage_init_start
-            print(f"[GET /api/requests] Storage client initialized in {storage_init_time:.3f}s")
-            print(f"[GET /api/requests] Storage bucket: {bucket_name}")
-        except Exception as e:
-            print(f"[GET /api/requests] WARNING: Could not initialize storage client: {e}")
-            print(f"[GET /api/requests] Solution file existence checks will be skipped")
-            import traceback
-            traceback.print_exc()
+        solution_blobs = {}
+        legacy_ids = []
+        for doc, data in docs:
+            if 'has_output' not in data and str(data.get('status', '')).lower() in ('complete', 'completed'):
+                legacy_ids.append(doc.id)
+        if legacy_ids:
+            try:
+                bucket = get_bucket()
+                logger.debug("[GET /api/requests] Storage bucket: %s", bucket.name)
+            except Exception as e:
+                logger.warning("[GET /api/requests] WARNING: Could not initialize storage client: %s", e)
+                logger.warning("[GET /api/requests] Solution file existence checks will be skipped", exc_info=True)
+        
+        # Look up legacy solution files with one glob listing, or for a few requests
+        # in parallel with one listing each; both return the blob metadata
+        batch_lookup = len(legacy_ids) >= SOLUTION_BATCH_LOOKUP_MIN and all(GLOB_SAFE_ID_RE.fullmatch(i) for i in legacy_ids)
+        if bucket and legacy_ids and batch_lookup:
+            lookup_start = time.time()
+            try:
+                solution_blobs = _find_solution_blobs(bucket, legacy_ids)
+            except Exception as e:
+                logger.error("[GET /api/requests] ERROR listing solution files: %s", e)
+            logger.debug("[GET /api/requests] Listed solution files for %s request(s) in %.3fs", len(legacy_ids), time.time() - lookup_start)
+        elif bucket and legacy_ids:
+            lookup_start = time.time()
+            # On the shared I/O pool, so a listing doesn't start and tear down its own threads
+            futures = {_io_executor.submit(_find_solution_blob, bucket, doc_id): doc_id for doc_id in legacy_ids}
+            for future in as_completed(futures):
+                try:
+                    solution_blobs[futures[future]] = future.result()
+                except Exception as e:
+                    logger.error("[GET /api/requests] ERROR checking solution file for %s: %s", futures[future], e)
+            logger.debug("[GET /api/requests] Checked %s solution file(s) in %.3fs", len(legacy_ids), time.time() - lookup_start)
         
         requests = []
         doc_count = 0
@@ -440,32 +795,31 @@ def get_user_requests():
         solution_check_count = 0
         solution_found_count = 0
         
-        print(f"[GET /api/requests] Processing documents from query...")
+        logger.debug("[GET /api/requests] Processing documents from query...")
         processing_start = time.time()
         
-        for doc in docs:
+        debug_enabled = logger.isEnabledFor(logging.DEBUG)
+        for doc, data in docs:
             doc_count += 1
             doc_id = doc.id
-            data = doc.to_dict()
-            
-            print(f"[GET /api/requests] Processing document {doc_count}: {doc_id}")
-            print(f"[GET /api/requests]   - Document path: {doc.reference.path}")
-            print(f"[GET /api/requests]   - Document exists: {doc.exists}")
             
             created_at = data.get('created_at')
             updated_at = data.get('updated_at')
             status = data.get('status', 'unknown')
             template_filename = data.get('template_filename', 'N/A')
             pdf_count = data.get('pdf_count', 0)
-            pdf_filenames = data.get('pdf_filenames', [])
             
-            print(f"[GET /api/requests]   - Status: {status}")
-            print(f"[GET /api/requests]   - Created at: {created_at}")
-            print(f"[GET /api/requests]   - Updated at: {updated_at}")
-            print(f"[GET /api/requests]   - Template filename: {template_filename}")
-            print(f"[GET /api/requests]   - PDF count: {pdf_count}")
-            if pdf_filenames:
-                print(f"[GET /api/requests]   - PDF filenames: {pdf_filenames[:3]}{'...' if len(pdf_filenames) > 3 else ''}")
+            if debug_enabled:
+                pdf_filenames = data.get('pdf_filenames', [])
+                logger.debug("[GET /api/requests] Processing document %s: %s", doc_count, doc_id)
+                logger.debug("[GET /api/requests]   - Document path: %s", doc.reference.path)
+                logger.debug("[GET /api/requests]   - Status: %s", status)
+                logger.debug("[GET /api/requests]   - Created at: %s", created_at)
+                logger.debug("[GET /api/requests]   - Updated at: %s", updated_at)
+                logger.debug("[GET /api/requests]   - Template filename: %s", template_filename)
+                logger.debug("[GET /api/requests]   - PDF count: %s", pdf_count)
+                if pdf_filenames:
+                    logger.debug("[GET /api/requests]   - PDF filenames: %s%s", pdf_filenames[:3], '...' if len(pdf_filenames) > 3 else '')
             
             # Count by status
             status_lower = status.lower()
@@ -476,120 +830,76 @@ def get_user_requests():
             elif status_lower in ('error', 'failed'):
                 error_count += 1
             
-            # Store timestamp for sorting
-            created_at_ts = created_at if created_at else datetime.min.replace(tzinfo=None)
-            
-            # Check if solution file exists in storage for completed requests
+            # Use the stored flag, falling back to storage for legacy completed requests
             has_output = False
-            if status_lower in ('complete', 'completed') and bucket:
+            if 'has_output' in data:
+                has_output = bool(data['has_output'])
+                logger.debug("[GET /api/requests]   - has_output from document: %s", has_output)
+            elif status_lower in ('complete', 'completed') and bucket:
                 solution_check_count += 1
                 try:
-                    blob_path = f"{doc_id}/solution.xlsx"
-                    print(f"[GET /api/requests]   - Checking for solution file at path: {blob_path}")
-                    
-                    solution_check_start = time.time()
-                    solution_blob = bucket.blob(blob_path)
-                    has_output = solution_blob.exists()
-                    solution_check_time = time.time() - solution_check_start
-                    
-                    print(f"[GET /api/requests]   - Solution file check completed in {solution_check_time:.3f}s")
-                    print(f"[GET /api/requests]   - Solution file exists: {has_output}")
+                    solution_blob = solution_blobs.get(doc_id)
+                    has_output = solution_blob is not None
+                    logger.debug("[GET /api/requests]   - Solution file exists: %s", has_output)
                     
                     if has_output:
                         solution_found_count += 1
-                        solution_blob.reload()
-                        print(f"[GET /api/requests]   - Solution file size: {solution_blob.size} bytes ({solution_blob.size / 1024:.2f} KB)")
-                        print(f"[GET /api/requests]   - Solution file created: {solution_blob.time_created}")
-                        print(f"[GET /api/requests]   - Solution file updated: {solution_blob.updated}")
+                        logger.debug("[GET /api/requests]   - Solution file size: %s bytes (%.2f KB)", solution_blob.size, solution_blob.size / 1024)
+                        logger.debug("[GET /api/requests]   - Solution file created: %s", solution_blob.time_created)
+                        logger.debug("[GET /api/requests]   - Solution file updated: %s", solution_blob.updated)
                     
-                    # If not found, try listing blobs in the folder to see what's there
-                    if not has_output:
-                        print(f"[GET /api/requests]   - Solution file not found, listing blobs in folder: {doc_id}/")
-                        try:
-                            list_start = time.time()
-                            blobs = list(bucket.list_blobs(prefix=f"{doc_id}/"))
-                            list_time = time.time() - list_start
-                            blob_names = [blob.name for blob in blobs]
-                            blob_sizes = {blob.name: blob.size for blob in blobs}
-                            print(f"[GET /api/requests]   - Blob listing completed in {list_time:.3f}s")
-                            print(f"[GET /api/requests]   - Found {len(blob_names)} blob(s) in folder:")
-                            for blob_name in blob_names[:10]:  # Limit to first 10
-                                size = blob_sizes.get(blob_name, 0)
-                                print(f"[GET /api/requests]     * {blob_name} ({size} bytes)")
-                            if len(blob_names) > 10:
-                                print(f"[GET /api/requests]     ... and {len(blob_names) - 10} more blob(s)")
-                        except Exception as list_err:
-                            print(f"[GET /api/requests]   - ERROR listing blobs: {list_err}")
-                            import traceback
-                            traceback.print_exc()
                 except Exception as e:
-                    print(f"[GET /api/requests]   - ERROR checking solution file: {e}")
-                    import traceback
-                    traceback.print_exc()
+                    logger.exception("[GET /api/requests]   - ERROR checking solution file: %s", e)
                     has_output = False
             elif status_lower not in ('complete', 'completed'):
-                print(f"[GET /api/requests]   - Skipping solution check (status is '{status}', not completed)")
+                logger.debug("[GET /api/requests]   - Skipping solution check (status is '%s', not completed)", status)
             
             request_data = {
                 'requestId': doc_id,
                 'status': status,
-                'created_at': created_at.isoformat() if created_at else None,
-                'updated_at': updated_at.isoformat() if updated_at else None,
+                'created_at': created_at,
+                'updated_at': updated_at,
                 'template_filename': template_filename,
                 'pdf_count': pdf_count,
-                'has_output': has_output,
-                '_sort_key': created_at_ts  # Temporary field for sorting
+                'has_output': has_output
             }
             requests.append(request_data)
-            print(f"[GET /api/requests]   - Added to results: requestId={doc_id}, status={status}, has_output={has_output}")
+            logger.debug("[GET /api/requests]   - Added to results: requestId=%s, status=%s, has_output=%s", doc_id, status, has_output)
         
         processing_time = time.time() - processing_start
-        print(f"[GET /api/requests] Processed {doc_count} document(s) in {processing_time:.3f}s")
-        print(f"[GET /api/requests] Status breakdown:")
-        print(f"[GET /api/requests]   - Completed: {completed_count}")
-        print(f"[GET /api/requests]   - Pending: {pending_count}")
-        print(f"[GET /api/requests]   - Error/Failed: {error_count}")
-        print(f"[GET /api/requests]   - Other/Unknown: {doc_count - completed_count - pending_count - error_count}")
-        print(f"[GET /api/requests] Solution file checks: {solution_check_count} checked, {solution_found_count} found")
-        
-        # Sort by created_at descending in Python
-        print(f"[GET /api/requests] Sorting requests by created_at (descending)...")
-        sort_start = time.time()
-        requests.sort(key=lambda x: x['_sort_key'], reverse=True)
-        sort_time = time.time() - sort_start
-        print(f"[GET /api/requests] Sorting completed in {sort_time:.3f}s")
-        
-        # Remove the temporary sort key field
-        for req in requests:
-            req.pop('_sort_key', None)
+        logger.info("[GET /api/requests] Processed %s document(s) in %.3fs", doc_count, processing_time)
+        logger.debug("[GET /api/requests] Status breakdown:")
+        logger.debug("[GET /api/requests]   - Completed: %s", completed_count)
+        logger.debug("[GET /api/requests]   - Pending: %s", pending_count)
+        logger.debug("[GET /api/requests]   - Error/Failed: %s", error_count)
+        logger.debug("[GET /api/requests]   - Other/Unknown: %s", doc_count - completed_count - pending_count - error_count)
+        logger.debug("[GET /api/requests] Solution file checks: %s checked, %s found", solution_check_count, solution_found_count)
         
         total_time = time.time() - start_time
-        print(f"[GET /api/requests] ========== GET REQUESTS SUCCESS ==========")
-        print(f"[GET /api/requests] Total requests found: {len(requests)}")
-        print(f"[GET /api/requests] Total processing time: {total_time:.3f}s")
-        print(f"[GET /api/requests]   - Firestore init: {firestore_init_time:.3f}s")
-        print(f"[GET /api/requests]   - Query execution: {query_time:.3f}s")
-        print(f"[GET /api/requests]   - Storage init: {storage_init_time:.3f}s")
-        print(f"[GET /api/requests]   - Document processing: {processing_time:.3f}s")
-        print(f"[GET /api/requests]   - Sorting: {sort_time:.3f}s")
-        print(f"[GET /api/requests] ===========================================")
-        
-        return jsonify({"requests": requests}), 200
+        logger.info("[GET /api/requests] ========== GET REQUESTS SUCCESS ==========")
+        logger.info("[GET /api/requests] Total requests found: %s", len(requests))
+        logger.info("[GET /api/requests] Total processing time: %.3fs", total_time)
+        logger.debug("[GET /api/requests]   - Query execution: %.3fs", query_time)
+        logger.debug("[GET /api/requests]   - Document processing: %.3fs", processing_time)
+        logger.debug("[GET /api/requests] ===========================================")
+        
+        response_body = {"requests": requests}
+        if next_page_token:
+            response_body["nextPageToken"] = next_page_token
+        return jsonify(response_body), 200
         
     except Exception as e:
         error_str = str(e)
         error_type = type(e).__name__
         total_time = time.time() - start_time
         
-        print(f"[GET /api/requests] ========== GET REQUESTS ERROR ==========")
-        print(f"[GET /api/requests] Error type: {error_type}")
-        print(f"[GET /api/requests] Error message: {error_str}")
-        print(f"[GET /api/requests] Request failed after {total_time:.3f}s")
-        print(f"[GET /api/requests] User: {email if 'email' in locals() else 'Unknown'}")
-        import traceback
-        print(f"[GET /api/requests] Traceback:")
-        traceback.print_exc()
-        print(f"[GET /api/requests] ========================================")
+        logger.error("[GET /api/requests] ========== GET REQUESTS ERROR ==========")
+        logger.error("[GET /api/requests] Error type: %s", error_type)
+        logger.error("[GET /api/requests] Error message: %s", error_str)
+        logger.error("[GET /api/requests] Request failed after %.3fs", total_time)
+        logger.error("[GET /api/requests] User: %s", email if 'email' in locals() else 'Unknown')
+        logger.exception("[GET /api/requests] Traceback:")
+        logger.debug("[GET /api/requests] ========================================")
         
         return jsonify({"error": "Failed to fetch requests"}), 500
 
@@ -599,87 +909,139 @@ def get_request_status(request_id):
     """Get status and details of a specific request."""
     try:
         email = request.user_email
-        print(f"[GET /api/requests/<request_id>] Request from user: {email}, request_id: {request_id}")
+        logger.info("[GET /api/requests/<request_id>] Request from user: %s, request_id: %s", email, request_id)
         
-        client = get_firestore_client()
-        doc_ref = client.collection('extraction_requests').document(request_id)
-        doc = doc_ref.get()
+        data = get_request_doc(request_id)
         
-        if not doc.exists:
+        if data is None:
             return jsonify({"error": "Request not found"}), 404
         
-        data = doc.to_dict()
-        
         # Verify the request belongs to this user
         if data.get('user_email') != email:
             return jsonify({"error": "Unauthorized"}), 403
         
-        # Check if solution file exists in storage
-        has_output = False
+        # The agent records has_output when it uploads the solution, so storage is only
+        # checked for completed requests written before that field existed
+        has_output = bool(data.get('has_output', False))
         status = data.get('status', '').lower()
-        if status in ('complete', 'completed'):
-            try:
-                storage_client = get_storage_client()
-                bucket_name = STORAGE_BUCKET.replace('gs://', '').strip()
-                bucket = storage_client.bucket(bucket_name)
-                blob_path = f"{request_id}/solution.xlsx"
-                solution_blob = bucket.blob(blob_path)
-                print(f"[GET /api/requests/<request_id>] Checking for solution file at path: {blob_path}")
-                has_output = solution_blob.exists()
-                print(f"[GET /api/requests/<request_id>] solution.xlsx exists={has_output}")
-                
-                # If not found, try listing blobs in the folder to see what's there
+        if 'has_output' not in data and status in ('complete', 'completed'):
+            blob_path = f"{request_id}/solution.xlsx"
+            with _missing_solution_cache_lock:
+                recently_missing = request_id in _missing_solution_cache
+            if not recently_missing:
+                try:
+                    logger.debug("[GET /api/requests/<request_id>] Checking for solution file at path: %s", blob_path)
+                    has_output = get_bucket().blob(blob_path).exists()
+                    logger.info("[GET /api/requests/<request_id>] solution.xlsx exists=%s", has_output)
+                except Exception as e:
+                    logger.exception("[GET /api/requests/<request_id>] Error checking solution file: %s", e)
+                    has_output = False
                 if not has_output:
-                    print(f"[GET /api/requests/<request_id>] File not found, listing blobs in folder: {request_id}/")
-                    try:
-                        blobs = list(bucket.list_blobs(prefix=f"{request_id}/"))
-                        blob_names = [blob.name for blob in blobs]
-                        print(f"[GET /api/requests/<request_id>] Found blobs in folder: {blob_names}")
-                    except Exception as list_err:
-                        print(f"[GET /api/requests/<request_id>] Error listing blobs: {list_err}")
-            except Exception as e:
-                print(f"[GET /api/requests/<request_id>] Error checking solution file: {e}")
-                import traceback
-                traceback.print_exc()
-                has_output = False
+                    with _missing_solution_cache_lock:
+                        _missing_solution_cache[request_id] = True
         
         response_data = {
             'requestId': request_id,
             'status': data.get('status', 'unknown'),
-            'created_at': data.get('created_at').isoformat() if data.get('created_at') else None,
-            'updated_at': data.get('updated_at').isoformat() if data.get('updated_at') else None,
+            'created_at': data.get('created_at'),
+            'updated_at': data.get('updated_at'),
             'template_filename': data.get('template_filename'),
             'pdf_count': data.get('pdf_count', 0),
             'pdf_filenames': data.get('pdf_filenames', []),
             'has_output': has_output
         }
         
-        print(f"[GET /api/requests/<request_id>] Request status: {response_data['status']}, has_output: {has_output}")
-        return jsonify(response_data), 200
+        logger.info("[GET /api/requests/<request_id>] Request status: %s, has_output: %s", response_data['status'], has_output)
+        return jsonify(response_data), 200, {OWNER_PROOF_HEADER: make_owner_proof(request_id, email)}
         
     except Exception as e:
-        print(f"[GET /api/requests/<request_id>] ERROR: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[GET /api/requests/<request_id>] ERROR: %s", e)
         return jsonify({"error": "Failed to fetch request status"}), 500
 
+@app.route('/api/requests/<request_id>/stream', methods=['GET'])
+@require_token
+def stream_request_status(request_id):
+    """Push status changes of a request as Server-Sent Events until it finishes."""
+    try:
+        email = request.user_email
+        logger.info("[GET /api/requests/<request_id>/stream] Request from user: %s, request_id: %s", email, request_id)
+        
+        data = get_request_doc(request_id)
+        
+        if data is None:
+            return jsonify({"error": "Request not found"}), 404
+        
+        # Verify the request belongs to this user
+        if data.get('user_email') != email:
+            return jsonify({"error": "Unauthorized"}), 403
+        
+        if not _status_stream_slots.acquire(blocking=False):
+            logger.warning("[GET /api/requests/<request_id>/stream] All %s stream slots busy, rejecting request: %s", STATUS_STREAM_MAX_PER_WORKER, request_id)
+            return jsonify({"error": "Too many open status streams, poll the request instead"}), 503, {'Retry-After': str(STATUS_STREAM_HEARTBEAT_SECONDS)}
+        try:
+            subscriber = _subscribe_status(request_id)
+        except Exception:
+            _status_stream_slots.release()
+            raise
+    except Exception as e:
+        logger.exception("[GET /api/requests/<request_id>/stream] ERROR: %s", e)
+        return jsonify({"error": "Failed to stream request status"}), 500
+    
+    def close_stream():
+        # Runs when the server closes the response, even if the client left before
+        # the generator started
+        _unsubscribe_status(request_id, subscriber)
+        _status_stream_slots.release()
+        logger.info("[GET /api/requests/<request_id>/stream] Stream closed for request: %s", request_id)
+    
+    def generate():
+        deadline = time.monotonic() + STATUS_STREAM_MAX_SECONDS
+        while time.monotonic() < deadline:
+            try:
+                data = subscriber.get(timeout=STATUS_STREAM_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                # Comment line so proxies don't close an idle connection
+                yield ": keep-alive\n\n"
+                continue
+            if data is None:
+                yield "event: deleted\ndata: {}\n\n"
+                return
+            
+            status = data.get('status', 'unknown')
+            event = {
+                'requestId': request_id,
+                'status': status,
+                'updated_at': data.get('updated_at'),
+                'has_output': bool(data.get('has_output')),
+            }
+            yield f"data: {app.json.dumps(event)}\n\n"
+            if status.lower() in FINAL_STATUSES:
+                return
+    
+    response = Response(
+        generate(),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+    response.call_on_close(close_stream)
+    return response
+
 @app.route('/api/requests/<request_id>/download', methods=['GET'])
 @require_token
 def download_output(request_id):
     """Download the solution.xlsx file for a completed request."""
     try:
         email = request.user_email
-        print(f"[GET /api/requests/<request_id>/download] Request from user: {email}, request_id: {request_id}")
+        logger.info("[GET /api/requests/<request_id>/download] Request from user: %s, request_id: %s", email, request_id)
         
-        client = get_firestore_client()
-        doc_ref = client.collection('extraction_requests').document(request_id)
-        doc = doc_ref.get()
+        data = get_request_doc(request_id)
         
-        if not doc.exists:
+        if data is None:
             return jsonify({"error": "Request not found"}), 404
         
-        data = doc.to_dict()
-        
         # Verify the request belongs to this user
         if data.get('user_email') != email:
             return jsonify({"error": "Unauthorized"}), 403
@@ -689,66 +1051,32 @@ def download_output(request_id):
         if status not in ('complete', 'completed'):
             return jsonify({"error": "Request is not complete yet"}), 400
         
-        # Get the solution file from storage
-        storage_client = get_storage_client()
-        bucket_name = STORAGE_BUCKET.replace('gs://', '').strip()
-        bucket = storage_client.bucket(bucket_name)
-        
-        # First, list all blobs in the folder to see what's there
-        blob_names = []
-        print(f"[GET /api/requests/<request_id>/download] Listing blobs in folder: {request_id}/")
-        try:
-            blobs = list(bucket.list_blobs(prefix=f"{request_id}/"))
-            blob_names = [blob.name for blob in blobs]
-            print(f"[GET /api/requests/<request_id>/download] Found blobs: {blob_names}")
-        except Exception as list_err:
-            print(f"[GET /api/requests/<request_id>/download] Error listing blobs: {list_err}")
-        
-        # Try to find solution.xlsx
+        # Requests finished by the current agent record whether a solution was written
         blob_path = f"{request_id}/solution.xlsx"
-        print(f"[GET /api/requests/<request_id>/download] Checking for file at: {blob_path}")
-        solution_blob = bucket.blob(blob_path)
-        
-        if not solution_blob.exists():
-            # Try alternative paths
-            alt_paths = [
-                f"{request_id}/solution.xlsx",
-                f"{request_id}solution.xlsx",
-                f"solution.xlsx",
-            ]
-            found = False
-            for alt_path in alt_paths:
-                alt_blob = bucket.blob(alt_path)
-                if alt_blob.exists():
-                    print(f"[GET /api/requests/<request_id>/download] Found file at alternative path: {alt_path}")
-                    solution_blob = alt_blob
-                    found = True
-                    break
-            
-            if not found:
-                return jsonify({
-                    "error": "Solution file not found",
-                    "details": f"Checked path: {blob_path}. Available files in folder: {blob_names if blob_names else 'unknown'}"
-                }), 404
-        
-        # Download the file content
-        file_content = solution_blob.download_as_bytes()
-        
-        print(f"[GET /api/requests/<request_id>/download] Successfully downloaded solution for request: {request_id}")
-        
-        # Return file as download
-        return Response(
-            file_content,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            headers={
-                'Content-Disposition': f'attachment; filename=solution_{request_id}.xlsx'
-            }
+        if data.get('has_output') is False:
+            return jsonify({
+                "error": "Solution file not found",
+                "details": f"Checked path: {blob_path}"
+            }), 404
+        
+        # Hand out a short-lived signed URL so the bytes go straight from storage
+        # to the client instead of through this server
+        url = get_bucket().blob(blob_path).generate_signed_url(
+            version="v4",
+            expiration=SIGNED_URL_EXPIRATION,
+            method="GET",
+            response_disposition=f'attachment; filename=solution_{request_id}.xlsx',
         )
+        logger.info("[GET /api/requests/<request_id>/download] Issued signed URL for request: %s", request_id)
+        
+        # fetch() callers can't follow a cross-origin redirect with their auth header,
+        # so they ask for the URL as JSON and navigate to it themselves
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify({"url": url}), 200
+        return redirect(url, code=302)
         
     except Exception as e:
-        print(f"[GET /api/requests/<request_id>/download] ERROR: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[GET /api/requests/<request_id>/download] ERROR: %s", e)
         return jsonify({"error": "Failed to download solution file"}), 500
 
 @app.route('/api/requests/<request_id>/trigger', methods=['POST'])
@@ -757,24 +1085,26 @@ def trigger_cloud_run_job(request_id):
     """Trigger the Cloud Run job for a specific request."""
     try:
         email = request.user_email
-        print(f"[POST /api/requests/<request_id>/trigger] Request from user: {email}, request_id: {request_id}")
-        
-        # Verify the request exists and belongs to this user
-        client = get_firestore_client()
-        doc_ref = client.collection('extraction_requests').document(request_id)
-        doc = doc_ref.get()
-        
-        if not doc.exists:
-            return jsonify({"error": "Request not found"}), 404
-        
-        data = doc.to_dict()
-        
-        # Verify the request belongs to this user
-        if data.get('user_email') != email:
-            return jsonify({"error": "Unauthorized"}), 403
+        logger.info("[POST /api/requests/<request_id>/trigger] Request from user: %s, request_id: %s", email, request_id)
+        
+        # Verify the request exists and belongs to this user, unless the caller
+        # holds a proof from an earlier response
+        if verify_owner_proof(request.headers.get(OWNER_PROOF_HEADER), request_id, email):
+            logger.debug("[POST /api/requests/<request_id>/trigger] Ownership verified by owner proof")
+        else:
+            data = get_request_doc(request_id)
+            
+            if data is None:
+                return jsonify({"error": "Request not found"}), 404
+            
+            # Verify the request belongs to this user
+            if data.get('user_email') != email:
+                return jsonify({"error": "Unauthorized"}), 403
         
         # Trigger Cloud Run job
         try:
+            from google.cloud.run_v2.types import RunJobRequest, EnvVar
+            
             # Create environment variable override for REQUEST_ID
             env_var_override = EnvVar(name="REQUEST_ID", value=request_id)
             
@@ -789,22 +1119,20 @@ def trigger_cloud_run_job(request_id):
             )
             
             # Create the RunJobRequest
-            job_name = f"projects/{PROJECT_ID}/locations/{CLOUD_RUN_LOCATION}/jobs/{CLOUD_RUN_JOB_ID}"
             run_job_request = RunJobRequest(
-                name=job_name,
+                name=JOB_NAME,
                 overrides=overrides
             )
             
-            # Initialize the Run client using service account
-            run_client = run_v2.JobsClient.from_service_account_info(
-                json.loads(FIREBASE_SERVICE_ACCOUNT)
-            )
+            run_client = get_run_client()
             
             # Run the job
-            print(f"[POST /api/requests/<request_id>/trigger] Triggering Cloud Run job: {job_name}")
-            print(f"[POST /api/requests/<request_id>/trigger] REQUEST_ID override: {request_id}")
+            logger.info("[POST /api/requests/<request_id>/trigger] Triggering Cloud Run job: %s", JOB_NAME)
+            logger.debug("[POST /api/requests/<request_id>/trigger] REQUEST_ID override: %s", request_id)
             operation = run_client.run_job(request=run_job_request)
-            print(f"[POST /api/requests/<request_id>/trigger] Cloud Run job triggered successfully")
+            # The job is about to change the status, so don't serve a cached copy
+            invalidate_request_doc(request_id)
+            logger.info("[POST /api/requests/<request_id>/trigger] Cloud Run job triggered successfully")
             
             return jsonify({
                 "message": "Cloud Run job triggered successfully",
@@ -814,20 +1142,19 @@ def trigger_cloud_run_job(request_id):
             
         except Exception as job_error:
             error_str = str(job_error)
-            print(f"[POST /api/requests/<request_id>/trigger] ERROR triggering Cloud Run job: {error_str}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("[POST /api/requests/<request_id>/trigger] ERROR triggering Cloud Run job: %s", error_str)
             return jsonify({
                 "error": "Failed to trigger Cloud Run job",
                 "details": error_str
             }), 500
         
     except Exception as e:
-        print(f"[POST /api/requests/<request_id>/trigger] ERROR: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("[POST /api/requests/<request_id>/trigger] ERROR: %s", e)
         return jsonify({"error": "Failed to trigger Cloud Run job"}), 500
 
+# Local development only; the container runs Gunicorn (see gunicorn.conf.py)
 if __name__ == '__main__':
-    print(f"[APP] Starting Flask server on host=0.0.0.0, port=5000, debug=True")
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    # Loopback only, and the Werkzeug debugger stays off unless FLASK_DEBUG=1
+    debug = os.environ.get("FLASK_DEBUG", "0") == "1"
+    logger.info("[APP] Starting Flask development server on host=127.0.0.1, port=5000, debug=%s", debug)
+    app.run(debug=debug, host='127.0.0.1', port=5000)
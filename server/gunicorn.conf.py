@@ -0,0 +1,45 @@
+# Gunicorn settings for the API server (loaded automatically from the working directory)
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+
+# Threaded workers: handlers spend their time waiting on Firestore/Storage, and the
+# cached clients are thread-safe, so each worker serves several requests at once.
+# GUNICORN_WORKER_CLASS=gevent multiplexes connections on greenlets instead, which
+# suits many long-lived /stream connections.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2))
+threads = int(os.environ.get("GUNICORN_THREADS", "8"))
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", "1000"))
+
+# One Firestore client per thread so concurrent requests don't queue on a channel
+os.environ.setdefault("FIRESTORE_POOL_SIZE", str(threads))
+
+# Each /stream connection pins a gthread thread for up to 15 minutes, so leave most
+# threads for the rest of the API; under gevent a stream only costs a greenlet
+if worker_class == "gevent":
+    os.environ.setdefault("STATUS_STREAM_MAX_PER_WORKER", str(worker_connections // 2))
+else:
+    os.environ.setdefault("STATUS_STREAM_MAX_PER_WORKER", str(max(1, threads // 4)))
+
+keepalive = 75
+timeout = 120
+worker_tmp_dir = "/dev/shm"
+
+
+def post_worker_init(worker):
+    """Build the per-worker clients after fork, so gRPC channels are never shared across processes."""
+    if worker_class == "gevent":
+        # gRPC (Firestore, Cloud Run) has to yield to gevent's patched sockets
+        from grpc.experimental import gevent as grpc_gevent
+        grpc_gevent.init_gevent()
+
+    from app import get_firestore_client, get_bucket, get_run_client, logger
+
+    try:
+        get_firestore_client()
+        get_bucket()
+        get_run_client()
+    except Exception as e:
+        logger.warning("[APP] Could not pre-initialize clients in worker %s: %s", worker.pid, e)
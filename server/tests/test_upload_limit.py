@@ -0,0 +1,48 @@
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("STORAGE_BUCKET", "gs://test-bucket")
+os.environ.setdefault("FIREBASE_SERVICE_ACCOUNT", "{}")
+
+import app as server_app
+
+
+class UploadLimitTest(unittest.TestCase):
+    def setUp(self):
+        self._verify = server_app.id_token.verify_oauth2_token
+        server_app.id_token.verify_oauth2_token = lambda token, request, client_id, **kwargs: {
+            "email": "user@example.com",
+            "name": "User",
+            "exp": 9999999999,
+        }
+        self._max_length = server_app.app.config["MAX_CONTENT_LENGTH"]
+        self._max_mb = server_app.MAX_UPLOAD_MB
+        server_app.MAX_UPLOAD_MB = 1
+        server_app.app.config["MAX_CONTENT_LENGTH"] = 1024 * 1024
+        self.client = server_app.app.test_client()
+
+    def tearDown(self):
+        server_app.id_token.verify_oauth2_token = self._verify
+        server_app.app.config["MAX_CONTENT_LENGTH"] = self._max_length
+        server_app.MAX_UPLOAD_MB = self._max_mb
+
+    def test_oversized_extract_upload_returns_json_413(self):
+        response = self.client.post(
+            "/api/extract",
+            headers={"Authorization": "Bearer test-token"},
+            data={
+                "template": (io.BytesIO(b"template"), "template.xlsx"),
+                "pdfs": [(io.BytesIO(b"%PDF-" + b"0" * (2 * 1024 * 1024)), "large.pdf")],
+            },
+            content_type="multipart/form-data",
+        )
+
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.get_json(), {"error": "Upload exceeds the 1 MB limit"})
+
+
+if __name__ == "__main__":
+    unittest.main()